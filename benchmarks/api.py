@@ -0,0 +1,250 @@
+"""
+In-process benchmark of the API: drives main:app through httpx.ASGITransport (no network, no server)
+against a local database seeded with a benchmark user and its contacts, and reports throughput and
+p50/p95/p99 latency per scenario.
+
+    git checkout main && python -m benchmarks.api --output baseline.json
+    git checkout my-branch && python -m benchmarks.api --output bench.json --baseline baseline.json
+
+Options such as --db sqlite+aiosqlite:///./bench.db --concurrency 10 --requests 200 must be the same
+for both runs. Results depend on the machine, so no baseline is committed: record it on the machine
+that runs the comparison.
+
+The database URL is exported as DB_URL before the app is imported, so the app uses it exactly as
+in production. Rate limits are disabled (pass --keep-rate-limits to measure them), because they would
+turn the benchmark into a measurement of 429 responses. Redis is used if it is reachable; otherwise
+the caches fall back to their local tiers, as in production. With --baseline, scenarios whose p95
+grew or whose throughput dropped by more than --threshold are reported and the exit code is 1.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_USER = {"username": "benchmark", "email": "benchmark@example.com", "password": "bench123"}
+SCENARIOS = ("login", "me", "contact_create", "contact_get", "contact_update", "contact_delete",
+             "list_page", "list_cursor", "export")
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """
+    The percentile function returns the nearest-rank percentile of already sorted values.
+    """
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    The compare function lists the scenarios that regressed against a baseline result file.
+
+    Args:
+        results: dict: Scenario results of this run
+        baseline: dict: Scenario results of the baseline run
+        threshold: float: Tolerated relative change, e.g. 0.2 for 20%
+
+    Returns:
+        One message per regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+async def seed(contacts: int):
+    """
+    The seed function creates the tables and the benchmark user with its contacts, unless the user exists.
+    """
+    from src.database.db import sessionmanager
+    from src.entity.models import Base, User
+    from src.repository import contacts as repositories_contacts
+    from src.repository import users as repositories_users
+    from src.services.auth import auth_service
+
+    async with sessionmanager.engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with sessionmanager.session() as db:
+        user = await repositories_users.get_user_by_email(BENCH_USER["email"], db)
+        if user is not None:
+            return
+        user = User(username=BENCH_USER["username"], email=BENCH_USER["email"], confirmed=True,
+                    password=await auth_service.get_password_hash(BENCH_USER["password"]))
+        db.add(user)
+        await db.commit()
+        rows = [{"first_name": f"first{i}", "last_name": f"last{i}", "email": f"contact{i}@example.com",
+                 "phone_number": f"+380{i:09d}", "birthday": datetime(1990, 1, 1).date(),
+                 "extra_info": "benchmark contact", "completed": bool(i % 2)} for i in range(contacts)]
+        for start in range(0, len(rows), 1000):
+            await repositories_contacts.create_contacts(rows[start:start + 1000], db, user)
+
+
+def disable_rate_limits(app) -> int:
+    """
+    The disable_rate_limits function overrides every RateLimiter dependency of the app with a no-op.
+    """
+
+    async def unlimited():
+        return None
+
+    count = 0
+    for route in app.routes:
+        dependant = getattr(route, "dependant", None)
+        for dependency in dependant.dependencies if dependant else ():
+            if type(dependency.call).__name__ == "RateLimiter":
+                app.dependency_overrides[dependency.call] = unlimited
+                count += 1
+    return count
+
+
+async def run_scenario(client, name: str, requests: int, concurrency: int, headers: dict) -> dict:
+    """
+    The run_scenario function sends requests of one scenario from concurrency workers and summarizes them.
+    """
+    counter = itertools.count()
+    created: list[int] = []
+    latencies: list[float] = []
+    errors = 0
+    contact_body = {"first_name": "bench", "last_name": "contact", "email": "bench@example.com",
+                    "phone_number": "+380000000000", "birthday": "1990-01-01", "extra_info": "benchmark"}
+
+    async def prepare():
+        if name in ("contact_get", "contact_update", "contact_delete"):
+            for _ in range(requests if name == "contact_delete" else 1):
+                response = await client.post("/api/contacts/", json=contact_body, headers=headers)
+                created.append(response.json()["id"])
+
+    async def call(i: int):
+        if name == "login":
+            return await client.post("/api/auth/login", data={"username": BENCH_USER["email"],
+                                                               "password": BENCH_USER["password"]})
+        if name == "me":
+            return await client.get("/api/users/me", headers=headers)
+        if name == "contact_create":
+            return await client.post("/api/contacts/", json=contact_body, headers=headers)
+        if name == "contact_get":
+            return await client.get(f"/api/contacts/{created[0]}", headers=headers)
+        if name == "contact_update":
+            return await client.put(f"/api/contacts/{created[0]}", json=dict(contact_body, completed=bool(i % 2)),
+                                    headers=headers)
+        if name == "contact_delete":
+            return await client.delete(f"/api/contacts/{created[i]}", headers=headers)
+        if name == "list_page":
+            return await client.get("/api/contacts/", params={"limit": 100, "offset": (i % 10) * 100},
+                                    headers=headers)
+        if name == "list_cursor":
+            response = await client.get("/api/contacts/", params={"limit": 100}, headers=headers)
+            cursor = response.headers.get("x-next-cursor")
+            if cursor:
+                response = await client.get("/api/contacts/", params={"limit": 100, "cursor": cursor},
+                                            headers=headers)
+            return response
+        if name == "export":
+            return await client.get("/api/contacts/export", headers=headers)
+        raise ValueError(f"Unknown scenario {name}")
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            started = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    await prepare()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    from main import app
+
+    await seed(args.contacts)
+    if not args.keep_rate_limits:
+        disable_rate_limits(app)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        response = await client.post("/api/auth/login", data={"username": BENCH_USER["email"],
+                                                               "password": BENCH_USER["password"]})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        for name in args.scenarios:
+            requests = min(args.requests, args.login_requests) if name == "login" else args.requests
+            results[name] = await run_scenario(client, name, requests, args.concurrency, headers)
+            print(f"{name:<16} {json.dumps(results[name])}")
+    from src.database.db import sessionmanager
+    await sessionmanager.engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="sqlite+aiosqlite:///./bench.db", help="Database URL (DB_URL)")
+    parser.add_argument("--contacts", type=int, default=5000, help="Contacts of the benchmark user")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20, help="Requests of the bcrypt-bound login")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Tolerated relative regression")
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db
+    logging.getLogger("src.services.cache").setLevel(logging.ERROR)
+    results = asyncio.run(benchmark(args))
+
+    report = {
+        "meta": {"created_at": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                 "db": args.db.split("://")[0], "concurrency": args.concurrency, "contacts": args.contacts},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
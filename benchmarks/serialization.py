@@ -0,0 +1,89 @@
+"""
+Per-row cost of encoding a page of contacts: the response_model path FastAPI takes
+(from_attributes validation, dump to JSON-able dicts, stdlib json.dumps) against
+src.services.serialization.encode_contacts.
+
+    python -m benchmarks.serialization --rows 500 --repeat 200
+"""
+import argparse
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+
+from src.entity.models import Base, Contact, User, Role
+from src.repository.contacts import _select_fields
+from src.schemas.contact import ContactFieldsResponse, ContactResponse
+from src.services import serialization
+from src.services.serialization import encode_contacts
+
+
+def make_contacts(count: int) -> list[Contact]:
+    user = User(id=1, username="bench", email="bench@example.com", avatar=None, role=Role.user)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        Contact(id=i, first_name=f"first{i}", last_name=f"last{i}", email=f"contact{i}@example.com",
+                phone_number=f"+380{i:09d}", birthday=date(1990, 1, 1) + timedelta(days=i % 365),
+                extra_info="extra info " * 3, completed=bool(i % 2), created_at=now, updated_at=now, user=user)
+        for i in range(1, count + 1)
+    ]
+
+
+def make_rows(contacts: list[Contact]):
+    """
+    Column-only rows as returned by get_contacts, from an in-memory SQLite copy of the contacts.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Contact.__table__])
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [{"id": 1, "username": "bench", "email": "bench@example.com",
+                                                      "password": "x", "role": Role.user}])
+        connection.execute(Contact.__table__.insert(), [
+            {column.key: getattr(contact, column.key) for column in Contact.__table__.columns if column.key != "user_id"}
+            | {"user_id": 1} for contact in contacts
+        ])
+        return connection.execute(_select_fields(None, False).order_by(Contact.id)).all()
+
+
+def pydantic_path(adapter: TypeAdapter, items, exclude_unset: bool) -> bytes:
+    validated = adapter.validate_python(items, from_attributes=True)
+    content = adapter.dump_python(validated, mode="json", exclude_unset=exclude_unset)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def measure(name: str, func, rows: int, repeat: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_row = (time.perf_counter() - started) / (repeat * rows) * 1e6
+    print(f"{name:<40} {per_row:8.2f} us/row")
+    return per_row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    contacts = make_contacts(args.rows)
+    rows = make_rows(contacts)
+    orm_adapter = TypeAdapter(list[ContactResponse])
+    rows_adapter = TypeAdapter(list[ContactFieldsResponse])
+    print(f"{args.rows} rows x {args.repeat}, orjson {'enabled' if serialization.orjson else 'not installed'}")
+
+    cases = [
+        ("ORM contacts, response_model", lambda: pydantic_path(orm_adapter, contacts, False)),
+        ("ORM contacts, encode_contacts", lambda: encode_contacts(contacts)),
+        ("column rows, response_model", lambda: pydantic_path(rows_adapter, rows, True)),
+        ("column rows, encode_contacts", lambda: encode_contacts(rows)),
+    ]
+    results = [measure(name, func, args.rows, args.repeat) for name, func in cases]
+    print(f"speedup: ORM x{results[0] / results[1]:.1f}, rows x{results[2] / results[3]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,33 @@
 import os
-import re
-from ipaddress import ip_address
-from typing import Callable
 from pathlib import Path
 
-import redis.asyncio as redis
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi_limiter import FastAPILimiter
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.db import get_db, sessionmanager
+from src.repository.outbox import outbox_stats
+from src.database.instrumentation import instrument_engine
 from src.routes import contacts, users, auth
 from src.conf.config import config
-
-app = FastAPI()
-banned_ips = [
-    ip_address("192.168.1.1"),
-    ip_address("192.168.1.2"),
-    ip_address("127.0.0.1"),
-    # ip_address("localhost"),
-]
+from src.middleware.ban import BanMiddleware, BanRules, install_reload_signal
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.metrics import MetricsMiddleware
+from src.middleware.queries import QueryTrackingMiddleware
+from src.services.auth import auth_service
+from src.services.cache import principal_cache, contact_list_cache
+from src.services.hashing import password_hasher
+from src.services.metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.services.pagination import NEXT_CURSOR_HEADER
+from src.services.serialization import FastJSONResponse
+
+app = FastAPI(default_response_class=FastJSONResponse)
+ban_rules = BanRules(config.BANNED_USER_AGENTS, config.BANNED_NETWORKS)
 
 origins = ["*"]
 
@@ -35,33 +37,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
-# @app.middleware("http")
-# async def ban_ips(request: Request, call_next: Callable):
-#     ip = ip_address(request.client.host)
-#     if ip in banned_ips:
-#         return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"detail": "You are banned"})
-#     response = await call_next(request)
-#     return response
-
-user_agent_ban_list = [r"Googlebot", r"Python-urllib"]  # Gecko
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=config.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=config.COMPRESSION_BROTLI_QUALITY,
+    zstd_level=config.COMPRESSION_ZSTD_LEVEL,
+)
 
+app.add_middleware(BanMiddleware, rules=ban_rules)
 
-@app.middleware("http")
-async def user_agent_ban_middleware(request: Request, call_next: Callable):
-    print(request.headers.get("Authorization"))
-    user_agent = request.headers.get("user-agent")
-    print(user_agent)
-    for ban_pattern in user_agent_ban_list:
-        if re.search(ban_pattern, user_agent):
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"detail": "You are banned"},
-            )
-    response = await call_next(request)
-    return response
+instrument_engine(sessionmanager.engine.sync_engine, config.SLOW_QUERY_SECONDS, config.QUERY_REPEAT_THRESHOLD)
+app.add_middleware(QueryTrackingMiddleware)
 
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=registry, server_timing=config.SERVER_TIMING_ENABLED)
+    registry.stats("db_pool", "Database connection pool", sessionmanager.pool_status)
+    registry.stats("password_hasher", "Password hashing executor", password_hasher.stats)
+    registry.stats("token_cache", "Decoded access token cache", auth_service.token_cache.stats)
+    registry.stats("principal_cache", "Per-worker cache of authenticated users", principal_cache.local.stats)
+    registry.stats("contact_list_cache", "Contact list response cache", contact_list_cache.stats)
 
 BASE_DIR = Path(__file__).parent
 directory = BASE_DIR.joinpath("src").joinpath("static")
@@ -74,13 +72,14 @@ app.include_router(contacts.router, prefix="/api")
 
 @app.on_event("startup")
 async def startup():
-    r = await redis.Redis(
-        host=config.REDIS_DOMAIN,
-        port=config.REDIS_PORT,
-        db=0,
-        password=config.REDIS_PASSWORD,
-    )
-    await FastAPILimiter.init(r)
+    principal_cache.start()
+    install_reload_signal(ban_rules)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await principal_cache.stop()
+    password_hasher.shutdown()
 
 
 templates = Jinja2Templates(directory=BASE_DIR / 'src' / "templates")
@@ -105,5 +104,25 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error connecting to the database")
 
 
+@app.get("/api/healthchecker/pool")
+async def pool_status():
+    return sessionmanager.pool_status()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/healthchecker/cache")
+async def cache_status():
+    return {"contact_list": contact_list_cache.stats()}
+
+
+@app.get("/api/healthchecker/email")
+async def email_status(db: AsyncSession = Depends(get_db)):
+    return await outbox_stats(db)
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), log_level="info")
@@ -0,0 +1,26 @@
+"""add contacts user_id id index
+
+Revision ID: 39703283dbb1
+Revises: 47673d07f7ed
+Create Date: 2026-10-17 22:34:42.311127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '39703283dbb1'
+down_revision: Union[str, None] = '47673d07f7ed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,61 @@
+"""convert contact birthday to date
+
+Revision ID: 51acad960f84
+Revises: 9da55c5eaa0e
+Create Date: 2026-10-17 22:41:57.112036
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil import parser
+
+
+# revision identifiers, used by Alembic.
+revision: str = '51acad960f84'
+down_revision: Union[str, None] = '9da55c5eaa0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTH_DAY = "(CAST(EXTRACT(MONTH FROM birthday) AS INTEGER) * 100 + CAST(EXTRACT(DAY FROM birthday) AS INTEGER))"
+
+
+def _parse_birthday(value):
+    try:
+        return parser.parse(value).date()
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_date', sa.Date(), nullable=True))
+
+    # backfill: strings that cannot be parsed as a date become NULL
+    connection = op.get_bind()
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('birthday', sa.String),
+                        sa.column('birthday_date', sa.Date))
+    result = connection.execution_options(yield_per=1000).execute(sa.select(contacts.c.id, contacts.c.birthday))
+    for rows in result.partitions():
+        values = [{"contact_id": row.id, "value": _parse_birthday(row.birthday)} for row in rows]
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam("contact_id"))
+            .values(birthday_date=sa.bindparam("value")),
+            values,
+        )
+
+    op.drop_index('ix_contacts_birthday', table_name='contacts')
+    op.drop_column('contacts', 'birthday')
+    op.alter_column('contacts', 'birthday_date', new_column_name='birthday')
+    op.execute(f"CREATE INDEX ix_contacts_user_id_birthday_md ON contacts (user_id, {MONTH_DAY})")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts')
+    op.alter_column('contacts', 'birthday', new_column_name='birthday_date')
+    op.add_column('contacts', sa.Column('birthday', sa.String(length=20), nullable=True))
+    op.execute("UPDATE contacts SET birthday = COALESCE(to_char(birthday_date, 'YYYY-MM-DD'), '')")
+    op.alter_column('contacts', 'birthday', nullable=False)
+    op.drop_column('contacts', 'birthday_date')
+    op.create_index('ix_contacts_birthday', 'contacts', ['birthday'], unique=False)
@@ -0,0 +1,33 @@
+"""add contacts search indexes
+
+Revision ID: 9da55c5eaa0e
+Revises: 39703283dbb1
+Create Date: 2026-10-17 22:40:17.477577
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9da55c5eaa0e'
+down_revision: Union[str, None] = '39703283dbb1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_DOCUMENT = ("(contacts.first_name || ' ' || contacts.last_name || ' ' || contacts.email"
+                   " || ' ' || contacts.phone_number)")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX ix_contacts_search_vector ON contacts USING gin (to_tsvector('simple', {SEARCH_DOCUMENT}))")
+    op.execute(f"CREATE INDEX ix_contacts_search_trgm ON contacts USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_search_trgm', table_name='contacts')
+    op.drop_index('ix_contacts_search_vector', table_name='contacts')
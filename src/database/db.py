@@ -1,15 +1,74 @@
 import contextlib
+import time
 
+from sqlalchemy import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import config
 
 
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long checkouts wait for a free connection. Only checkouts that find
+    the pool at capacity (no idle connection and no overflow left) wait; they are counted in
+    wait_count, every checkout in checkouts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _at_capacity(self) -> bool:
+        return -1 < self._max_overflow <= self._overflow and self.checkedin() == 0
+
+    def _do_get(self):
+        self.checkouts += 1
+        if not self._at_capacity():
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_count += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
 class DatabaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self._engine: AsyncEngine | None = create_async_engine(url, **self._pool_options(url))
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
-                                                                     bind=self._engine)
+                                                                     expire_on_commit=False, bind=self._engine)
+
+    @staticmethod
+    def _pool_options(url: str) -> dict:
+        if make_url(url).get_backend_name() == "sqlite":
+            return {}
+        return {
+            "poolclass": TimedAsyncQueuePool,
+            "pool_size": config.DB_POOL_SIZE,
+            "max_overflow": config.DB_MAX_OVERFLOW,
+            "pool_timeout": config.DB_POOL_TIMEOUT,
+            "pool_recycle": config.DB_POOL_RECYCLE,
+            "pool_pre_ping": config.DB_POOL_PRE_PING,
+        }
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            raise Exception("Engine is not initialized")
+        return self._engine
+
+    @property
+    def session_maker(self) -> async_sessionmaker:
+        if self._session_maker is None:
+            raise Exception("Session is not initialized")
+        return self._session_maker
 
     @contextlib.asynccontextmanager
     async def session(self):
@@ -18,15 +77,54 @@ class DatabaseSessionManager:
         session = self._session_maker()
         try:
             yield session
-        except:
+        except Exception:
             await session.rollback()
+            raise
         finally:
             await session.close()
 
+    def pool_status(self) -> dict:
+        """
+        The pool_status function returns gauges of the connection pool.
+
+        Returns:
+            Pool size, checked in/out and overflow connections, and checkout wait statistics
+            (only for queue pools; other pools report an empty dict)
+        """
+        pool = self._engine.pool
+        if not isinstance(pool, AsyncAdaptedQueuePool):
+            return {}
+        status = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+        if isinstance(pool, TimedAsyncQueuePool):
+            status.update(
+                checkouts=pool.checkouts,
+                wait_count=pool.wait_count,
+                wait_seconds_total=pool.wait_seconds_total,
+                wait_seconds_max=pool.wait_seconds_max,
+            )
+        return status
+
 
 sessionmanager = DatabaseSessionManager(config.DB_URL)
 
 
 async def get_db():
+    """
+    The get_db function provides one session per request and closes it when the request is done.
+    """
     async with sessionmanager.session() as session:
-        return session
+        yield session
+
+
+def get_session_maker() -> async_sessionmaker:
+    """
+    The get_session_maker function provides the session factory to routes that stream their response.
+        Such routes must open their own session inside the response body, because request-scoped
+        sessions are closed before a StreamingResponse starts sending.
+    """
+    return sessionmanager.session_maker
@@ -0,0 +1,147 @@
+import contextlib
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.services.metrics import registry, record_timing
+
+logger = logging.getLogger(__name__)
+
+queries_total = registry.counter("db_queries_total", "SQL statements executed")
+query_duration = registry.histogram("db_query_duration_seconds", "SQL statement execution time",
+                                    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+slow_queries_total = registry.counter("db_slow_queries_total", "SQL statements slower than the slow query threshold")
+repeated_queries_total = registry.counter("db_repeated_queries_total",
+                                          "Requests that repeated one statement shape up to the N+1 threshold")
+
+
+class QueryStats:
+    """
+    The statements of one unit of work (usually one request): how many, how long, and how often
+    each statement text was executed. The statement text with its placeholders is the shape of a
+    query, so the same SELECT issued once per row of a list shows up as one shape with a high count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: list[str] = []
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, seconds: float) -> int:
+        self.count += 1
+        self.seconds += seconds
+        self.statements.append(statement)
+        self.shapes[statement] += 1
+        return self.shapes[statement]
+
+
+current_queries: ContextVar[QueryStats | None] = ContextVar("current_queries", default=None)
+
+
+@contextlib.contextmanager
+def track_queries():
+    """
+    The track_queries function attributes the statements executed inside the block (in this context,
+    including SQLAlchemy's greenlets) to a fresh QueryStats.
+    """
+    stats = QueryStats()
+    token = current_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        current_queries.reset(token)
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """
+    The parameter_shape function describes bound parameters by type only, so values (emails, phone
+        numbers, password hashes) never reach the logs.
+
+    Args:
+        parameters: Any: DBAPI parameters of the statement
+        executemany: bool: Whether parameters is a sequence of parameter sets
+
+    Returns:
+        E.g. "(int, str)", "{email: str}" or "1000 x (int, str)"
+    """
+    if executemany:
+        parameters = list(parameters)
+        if not parameters:
+            return "0 x ()"
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def instrument_engine(engine: Engine, slow_query_seconds: float, repeat_threshold: int) -> None:
+    """
+    The instrument_engine function hooks cursor execution of an engine to count and time every statement.
+        Each statement is added to the Prometheus metrics, to the db phase of Server-Timing and to
+        the QueryStats of the current request. Statements slower than slow_query_seconds are logged
+        with their parameter shape; a statement shape executed repeat_threshold times within one
+        request is logged once as a probable N+1 pattern.
+
+    Args:
+        engine: Engine: Synchronous engine, e.g. AsyncEngine.sync_engine
+        slow_query_seconds: float: Threshold of the slow query log; 0 disables it
+        repeat_threshold: int: Executions of one shape per request before warning; 0 disables it
+    """
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        queries_total.inc()
+        query_duration.observe(elapsed)
+        record_timing("db", elapsed)
+        if slow_query_seconds and elapsed >= slow_query_seconds:
+            slow_queries_total.inc()
+            logger.warning("slow query (%.1f ms): %s; parameters %s", elapsed * 1000, statement,
+                           parameter_shape(parameters, executemany))
+        stats = current_queries.get()
+        if stats is not None and stats.record(statement, elapsed) == repeat_threshold and not executemany:
+            repeated_queries_total.inc()
+            logger.warning("statement executed %d times in one request, possible N+1: %s",
+                           repeat_threshold, statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+@contextlib.contextmanager
+def query_budget(engine: Engine, max_queries: int):
+    """
+    The query_budget function asserts that the block executes at most max_queries statements on the engine.
+        It counts on the engine itself rather than through the request context, so it also sees
+        statements of an app driven by TestClient in another thread. Meant for tests.
+
+    Args:
+        engine: Engine: Synchronous engine used by the code under test
+        max_queries: int: Allowed number of statements
+
+    Raises:
+        AssertionError: With the executed statements, if there were more than max_queries
+    """
+    stats = QueryStats()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, 0.0)
+
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "after_cursor_execute", after_cursor_execute)
+    if stats.count > max_queries:
+        listing = "\n".join(f"  {statement}" for statement in stats.statements)
+        raise AssertionError(f"{stats.count} queries executed, budget is {max_queries}:\n{listing}")
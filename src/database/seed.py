@@ -0,0 +1,199 @@
+"""
+Deterministic synthetic data for benchmarks and index tuning.
+
+    python -m src.database.seed --users 5000 --contacts 10000000 --seed 42 --db postgresql+asyncpg://...
+
+The same --seed always produces the same users and contacts. Contacts are spread over users by a Zipf
+distribution (a few users own most of the contacts, like real contact books), all users share one
+bcrypt hash of --password computed once, and rows are loaded in batches with COPY on PostgreSQL
+(asyncpg) and executemany elsewhere. Users are inserted as seed<seed>.user<n>@example.com, so several
+seeds can be loaded into one database; loading a seed that is already there is refused up front. On
+SQLite the FTS search index is rebuilt once after the load instead of row by row.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import select, insert, func, Table
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from src.conf.config import config
+from src.entity.models import Base, Contact, User, Role, SEARCH_DDL, SEARCH_FTS_TABLE
+from src.services.hashing import pwd_context
+
+FIRST_NAMES = ("Olena", "Andrii", "Iryna", "Taras", "Maria", "Oleh", "Sofia", "Dmytro", "Anna", "Yurii",
+               "Kateryna", "Mykola", "Natalia", "Bohdan", "Daryna", "Ivan", "Oksana", "Roman", "Viktoria", "Serhii")
+LAST_NAMES = ("Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Shevchuk",
+              "Polishchuk", "Lysenko", "Marchenko", "Rudenko", "Savchenko", "Petrenko", "Moroz", "Melnyk")
+DOMAINS = ("example.com", "example.org", "example.net", "mail.example.com")
+EXTRA_INFO = ("work", "family", "friend", "gym", "school", "neighbour", "doctor", "client", "supplier")
+CONTACT_COLUMNS = ("first_name", "last_name", "email", "phone_number", "birthday", "extra_info", "completed",
+                   "created_at", "updated_at", "user_id")
+USER_COLUMNS = ("username", "email", "password", "role", "confirmed", "created_at", "updated_at")
+EPOCH = datetime(2024, 1, 1)
+
+
+def zipf_counts(total: int, buckets: int, exponent: float, rng: random.Random) -> list[int]:
+    """
+    The zipf_counts function splits total into buckets with Zipf weights 1/rank**exponent,
+        assigning the ranks to buckets in a seeded random order.
+
+    Args:
+        total: int: Number of items to distribute
+        buckets: int: Number of buckets (users)
+        exponent: float: Skew; 0 is uniform, around 1 is typical for real data
+        rng: random.Random: Seeded generator
+
+    Returns:
+        Counts per bucket summing to total
+    """
+    if buckets <= 0:
+        return []
+    weights = [1 / (rank ** exponent) for rank in range(1, buckets + 1)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for rank in range(total - sum(counts)):
+        counts[rank % buckets] += 1
+    rng.shuffle(counts)
+    return counts
+
+
+def generate_users(seed: int, count: int, password_hash: str) -> Iterator[tuple]:
+    for n in range(count):
+        created = EPOCH - timedelta(days=n % 730)
+        yield (f"seed{seed}user{n}"[:50], f"seed{seed}.user{n}@example.com", password_hash, Role.user.name, True,
+               created, created)
+
+
+def generate_contacts(rng: random.Random, user_id: int, count: int) -> Iterator[tuple]:
+    for n in range(count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        created = EPOCH - timedelta(seconds=rng.randrange(2 * 365 * 86400))
+        yield (
+            first_name,
+            last_name,
+            f"{first_name}.{last_name}.{user_id}.{n}@{rng.choice(DOMAINS)}"[:40].lower(),
+            f"+380{rng.randrange(10 ** 9):09d}",
+            date(1950, 1, 1) + timedelta(days=rng.randrange(60 * 365)) if rng.random() < 0.9 else None,
+            rng.choice(EXTRA_INFO),
+            rng.random() < 0.3,
+            created,
+            created,
+            user_id,
+        )
+
+
+async def load(connection: AsyncConnection, table: Table, columns: tuple[str, ...], records: list[tuple]) -> None:
+    """
+    The load function bulk-inserts records, with COPY on asyncpg and an executemany INSERT elsewhere.
+    """
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(table.name, records=records,
+                                                                     columns=list(columns))
+    else:
+        await connection.execute(insert(table), [dict(zip(columns, record)) for record in records])
+
+
+async def seed_database(engine: AsyncEngine, users: int, contacts: int, seed: int = 42, batch_size: int = 10000,
+                        exponent: float = 1.1, password: str = "password", progress: bool = False) -> dict:
+    """
+    The seed_database function creates missing tables and loads users and contacts generated from seed.
+
+    Args:
+        engine: AsyncEngine: Target database
+        users: int: Number of users
+        contacts: int: Total number of contacts
+        seed: int: Seed of the generator; the same seed always yields the same data
+        batch_size: int: Rows per COPY / executemany, committed one batch at a time
+        exponent: float: Zipf skew of contacts per user
+        password: str: Password of every seeded user, hashed once
+        progress: bool: Print the load rate after every batch
+
+    Returns:
+        Counts of inserted rows and the elapsed seconds
+
+    Raises:
+        ValueError: If users of this seed are already in the database; nothing is loaded then
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        existing = await connection.scalar(select(func.count(User.id)).where(User.email.like(f"seed{seed}.user%")))
+    if existing:
+        raise ValueError(f"The database already has {existing} users of seed {seed}; "
+                         f"use another --seed or a fresh database")
+
+    password_hash = pwd_context.hash(password)
+    user_rows = list(generate_users(seed, users, password_hash))
+    for start in range(0, len(user_rows), batch_size):
+        async with engine.begin() as connection:
+            await load(connection, User.__table__, USER_COLUMNS, user_rows[start:start + batch_size])
+    async with engine.connect() as connection:
+        result = await connection.execute(select(User.id, User.email).where(User.email.like(f"seed{seed}.user%")))
+        ids = {email: user_id for user_id, email in result}
+    user_ids = [ids[row[1]] for row in user_rows]
+
+    # The per-row FTS insert trigger costs more than the insert itself on SQLite; one rebuild of the
+    # external-content index after the load is far cheaper.
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite:
+        async with engine.begin() as connection:
+            await connection.exec_driver_sql("DROP TRIGGER IF EXISTS contacts_fts_ai")
+    loaded = 0
+    batch: list[tuple] = []
+    try:
+        for user_id, count in zip(user_ids, zipf_counts(contacts, len(user_ids), exponent, rng)):
+            for record in generate_contacts(rng, user_id, count):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    loaded += await _flush(engine, batch, started, loaded, progress)
+        if batch:
+            loaded += await _flush(engine, batch, started, loaded, progress)
+    finally:
+        if sqlite:
+            async with engine.begin() as connection:
+                await connection.exec_driver_sql(
+                    f"INSERT INTO {SEARCH_FTS_TABLE}({SEARCH_FTS_TABLE}) VALUES ('rebuild')")
+                await connection.exec_driver_sql(SEARCH_DDL["sqlite"][1])
+    return {"users": len(user_rows), "contacts": loaded, "seconds": round(time.perf_counter() - started, 2)}
+
+
+async def _flush(engine: AsyncEngine, batch: list[tuple], started: float, loaded: int, progress: bool) -> int:
+    async with engine.begin() as connection:
+        await load(connection, Contact.__table__, CONTACT_COLUMNS, batch)
+    count = len(batch)
+    batch.clear()
+    if progress:
+        elapsed = time.perf_counter() - started
+        print(f"{loaded + count} contacts, {(loaded + count) / elapsed:.0f} rows/s")
+    return count
+
+
+async def main(args) -> None:
+    engine = create_async_engine(args.db or config.DB_URL)
+    try:
+        report = await seed_database(engine, args.users, args.contacts, args.seed, args.batch_size, args.exponent,
+                                     args.password, progress=True)
+    except ValueError as err:
+        raise SystemExit(err)
+    finally:
+        await engine.dispose()
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Database URL, DB_URL from the config by default")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--exponent", type=float, default=1.1, help="Zipf skew of contacts per user")
+    parser.add_argument("--password", default="password", help="Password of every seeded user")
+    asyncio.run(main(parser.parse_args()))
@@ -1,31 +1,99 @@
 import enum
-from datetime import date
+from datetime import date, datetime
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, ForeignKey, DateTime, func, Enum, Boolean
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Date, func, Enum, Boolean, Index, DDL, event, JSON
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class month_day(FunctionElement):
+    """
+    month * 100 + day of a date column as an integer (e.g. 1231 for December 31),
+    used to index and query birthdays independently of the year.
+    """
+    type = Integer()
+    name = "month_day"
+    inherit_cache = True
+
+
+@compiles(month_day)
+def _compile_month_day(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return f"(CAST(EXTRACT(MONTH FROM {value}) AS INTEGER) * 100 + CAST(EXTRACT(DAY FROM {value}) AS INTEGER))"
+
+
+@compiles(month_day, "sqlite")
+def _compile_month_day_sqlite(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return f"CAST(strftime('%m%d', {value}) AS INTEGER)"
+
+
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     first_name: Mapped[str] = mapped_column(String(20), index=True)
     last_name: Mapped[str] = mapped_column(String(20), index=True)
     email: Mapped[str] = mapped_column(String(40), index=True)
     phone_number: Mapped[str] = mapped_column(String(20), index=True)
-    birthday: Mapped[str] = mapped_column(String(20), index=True)
+    birthday: Mapped[date | None] = mapped_column(Date, nullable=True)
     extra_info: Mapped[str] = mapped_column(String(250))
     completed: Mapped[bool] = mapped_column(default=False)
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
-    updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(),
-                                             nullable=True)
+    # set from Python with microseconds: it is the version in the ETag, and func.now() has one-second
+    # resolution on SQLite, so two writes within a second would share a tag
+    updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=datetime.utcnow,
+                                             onupdate=datetime.utcnow, nullable=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
-    user: Mapped["User"] = relationship("User", backref="contacts", lazy="joined")
+    # not loaded unless a query asks for it (joinedload / include=user), so contact lists don't join users
+    user: Mapped["User"] = relationship("User", backref="contacts", lazy="noload")
+
+
+Index("ix_contacts_user_id_birthday_md", Contact.user_id, month_day(Contact.birthday))
+
+# Contact search: the PostgreSQL expression indexes below must be matched verbatim by the search query,
+# so both use these strings. SQLite gets an external-content FTS5 table kept in sync by triggers.
+SEARCH_COLUMNS = ("first_name", "last_name", "email", "phone_number")
+SEARCH_DOCUMENT_SQL = "(" + " || ' ' || ".join(f"contacts.{column}" for column in SEARCH_COLUMNS) + ")"
+SEARCH_VECTOR_SQL = f"to_tsvector('simple', {SEARCH_DOCUMENT_SQL})"
+SEARCH_FTS_TABLE = "contacts_fts"
+
+_fts_columns = ", ".join(SEARCH_COLUMNS)
+_fts_new = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+_fts_old = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+_fts_delete = (f"INSERT INTO {SEARCH_FTS_TABLE}({SEARCH_FTS_TABLE}, rowid, {_fts_columns}) "
+               f"VALUES ('delete', old.id, {_fts_old});")
+_fts_insert = f"INSERT INTO {SEARCH_FTS_TABLE}(rowid, {_fts_columns}) VALUES (new.id, {_fts_new});"
+
+SEARCH_DDL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS ix_contacts_search_vector ON contacts USING gin ({SEARCH_VECTOR_SQL})",
+        f"CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts USING gin ({SEARCH_DOCUMENT_SQL} gin_trgm_ops)",
+    ],
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_FTS_TABLE} USING fts5({_fts_columns}, "
+        f"content='contacts', content_rowid='id')",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN {_fts_insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN {_fts_delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN {_fts_delete} {_fts_insert} END",
+    ],
+}
+
+for _dialect, _statements in SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Contact.__table__, "before_drop",
+             DDL(f"DROP TABLE IF EXISTS {SEARCH_FTS_TABLE}").execute_if(dialect="sqlite"))
 
 
 class Role(enum.Enum):
@@ -46,3 +114,30 @@ class User(Base):
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     role: Mapped[Enum] = mapped_column('role', Enum(Role), default=Role.user, nullable=True)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
+
+
+class OutboxStatus(enum.Enum):
+    pending: str = "pending"
+    sent: str = "sent"
+    failed: str = "failed"
+
+
+class EmailOutbox(Base):
+    """
+    Emails waiting for the email worker. Rows are written in the request that triggers the email and
+    drained by src.services.email_worker; next_attempt_at doubles as the claim lease of a worker and
+    as the retry backoff after a failed attempt.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    template: Mapped[str] = mapped_column(String(100))
+    subject: Mapped[str] = mapped_column(String(255))
+    recipient: Mapped[str] = mapped_column(String(150))
+    context: Mapped[dict] = mapped_column(JSON, default=dict)
+    status: Mapped[OutboxStatus] = mapped_column(Enum(OutboxStatus), default=OutboxStatus.pending)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import re
+import signal
+from ipaddress import ip_address, ip_network, IPv4Network, IPv6Network
+from typing import Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf.config import Settings
+
+logger = logging.getLogger(__name__)
+
+BANNED_BODY = b'{"detail":"You are banned"}'
+
+
+class BanRules:
+    """
+    Compiled ban lists: one regex alternation of all user agent patterns, and the banned networks
+    as sets of network addresses per (IP version, prefix length). An address is banned when its
+    masked value is in the set of any prefix length, so a lookup costs one set probe per distinct
+    prefix length, not one comparison per network. load() replaces everything in one assignment,
+    so requests never see half-loaded rules.
+    """
+
+    def __init__(self, user_agents: Iterable[str] = (), networks: Iterable[str] = ()):
+        self._user_agents: re.Pattern | None = None
+        self._networks: dict[int, list[tuple[int, set[int]]]] = {}
+        self.load(user_agents, networks)
+
+    def load(self, user_agents: Iterable[str], networks: Iterable[str]) -> None:
+        """
+        The load function compiles new ban lists and swaps them in.
+
+        Args:
+            user_agents: Iterable[str]: Regular expressions searched in the User-Agent header
+            networks: Iterable[str]: IP addresses or CIDR networks, e.g. "10.0.0.0/8" or "2001:db8::/32"
+
+        Raises:
+            ValueError: If a network is not a valid address or CIDR; the current rules are kept
+            re.error: If a pattern does not compile; the current rules are kept
+        """
+        patterns = [pattern for pattern in user_agents if pattern]
+        compiled = re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+        by_prefix: dict[tuple[int, int], set[int]] = {}
+        for network in networks:
+            parsed: IPv4Network | IPv6Network = ip_network(network.strip(), strict=False)
+            by_prefix.setdefault((parsed.version, parsed.prefixlen), set()).add(int(parsed.network_address))
+        tables: dict[int, list[tuple[int, set[int]]]] = {}
+        for (version, prefixlen), addresses in sorted(by_prefix.items()):
+            bits = 32 if version == 4 else 128
+            mask = ((1 << prefixlen) - 1) << (bits - prefixlen)
+            tables.setdefault(version, []).append((mask, addresses))
+        self._user_agents, self._networks = compiled, tables
+
+    def reload(self, settings: Settings | None = None) -> None:
+        """
+        The reload function rebuilds the rules from BANNED_USER_AGENTS and BANNED_NETWORKS,
+            re-reading the environment and .env unless settings are given. Invalid entries are
+            logged and the previous rules stay active.
+        """
+        settings = settings or Settings()
+        try:
+            self.load(settings.BANNED_USER_AGENTS, settings.BANNED_NETWORKS)
+        except (ValueError, re.error) as err:
+            logger.error("ban rules were not reloaded: %s", err)
+            return
+        logger.info("ban rules reloaded: %d user agent patterns, %d networks",
+                    len(settings.BANNED_USER_AGENTS), len(settings.BANNED_NETWORKS))
+
+    def is_banned_user_agent(self, user_agent: str | None) -> bool:
+        return bool(user_agent and self._user_agents and self._user_agents.search(user_agent))
+
+    def is_banned_host(self, host: str | None) -> bool:
+        """
+        The is_banned_host function checks a client host against the banned networks.
+            Hosts that are not IP addresses (e.g. "testclient", unix sockets) are never banned.
+        """
+        if not host or not self._networks:
+            return False
+        try:
+            address = ip_address(host)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        value = int(address)
+        return any(value & mask in addresses for mask, addresses in self._networks.get(address.version, ()))
+
+
+class BanMiddleware:
+    """
+    Pure ASGI middleware answering 403 to banned clients before the request reaches the app.
+    """
+
+    def __init__(self, app: ASGIApp, rules: BanRules):
+        self.app = app
+        self.rules = rules
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            client = scope.get("client")
+            user_agent = None
+            for name, value in scope["headers"]:
+                if name == b"user-agent":
+                    user_agent = value.decode("latin-1")
+                    break
+            host = client[0] if client else None
+            if self.rules.is_banned_host(host) or self.rules.is_banned_user_agent(user_agent):
+                await send({"type": "http.response.start", "status": 403,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(BANNED_BODY)).encode())]})
+                await send({"type": "http.response.body", "body": BANNED_BODY})
+                return
+        await self.app(scope, receive, send)
+
+
+def install_reload_signal(rules: BanRules) -> bool:
+    """
+    The install_reload_signal function makes SIGHUP reload the ban rules from config (kill -HUP <pid>).
+
+    Args:
+        rules: BanRules: Rules used by BanMiddleware
+
+    Returns:
+        False where signal handlers cannot be installed (Windows, event loop outside the main thread)
+    """
+    sighup = getattr(signal, "SIGHUP", None)
+    if sighup is None:
+        return False
+    try:
+        asyncio.get_running_loop().add_signal_handler(sighup, rules.reload)
+    except (NotImplementedError, RuntimeError, ValueError):
+        return False
+    return True
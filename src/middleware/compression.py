@@ -0,0 +1,201 @@
+import zlib
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml", "image/svg+xml")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        The compress function compresses a chunk and flushes it, so the client can decode everything sent so far.
+        """
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    The parse_accept_encoding function reads the codings of an Accept-Encoding header with their q-values.
+
+    Args:
+        header: str: Value of the header, e.g. "br;q=1.0, gzip;q=0.8, *;q=0"
+
+    Returns:
+        A dict of lower-cased coding to q-value; malformed q-values count as 0
+    """
+    codings = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware that compresses textual responses with the best coding the client accepts.
+        Server preference on equal q-values is br, zstd, gzip; br and zstd are used only when the
+        brotli / zstandard packages are installed. Complete bodies below minimum_size are sent as is.
+        Streaming bodies are compressed chunk by chunk and flushed after every chunk, so a
+        StreamingResponse stays streaming. Strong ETags are made weak on compressed responses.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4,
+                 zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders: dict[str, Callable[[], GzipEncoder | BrotliEncoder | ZstdEncoder]] = {}
+        if brotli is not None:
+            self.encoders["br"] = lambda: BrotliEncoder(brotli_quality)
+        if zstandard is not None:
+            self.encoders["zstd"] = lambda: ZstdEncoder(zstd_level)
+        self.encoders["gzip"] = lambda: GzipEncoder(gzip_level)
+
+    def select_encoding(self, accept_encoding: str) -> str | None:
+        """
+        The select_encoding function picks the supported coding with the highest q-value, or None for identity.
+        """
+        codings = parse_accept_encoding(accept_encoding)
+        default = codings.get("*", 0.0)
+        best, best_quality = None, 0.0
+        for name in self.encoders:
+            quality = codings.get(name, default)
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, self.encoders[encoding], self.minimum_size)(scope, receive, send)
+
+
+class CompressionResponder:
+    """
+    State of one response: holds back http.response.start until the first body message shows
+        whether the body is complete (compress it if big enough) or streamed (compress incrementally).
+    """
+
+    def __init__(self, app: ASGIApp, encoder_factory: Callable, minimum_size: int):
+        self.app = app
+        self.encoder_factory = encoder_factory
+        self.minimum_size = minimum_size
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _compressible(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        content_type = headers.get("content-type", "")
+        return (message["status"] not in (204, 304) and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES))
+
+    def _start_encoded(self) -> None:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoder.name
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._compressible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if self.passthrough or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            if not more_body and len(body) < self.minimum_size:
+                MutableHeaders(raw=self.start_message["headers"]).add_vary_header("Accept-Encoding")
+                await self.send(self.start_message)
+                await self.send(message)
+                self.passthrough = True
+                return
+            self.encoder = self.encoder_factory()
+            self._start_encoded()
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.encoder.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.start_message)
+
+        body = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
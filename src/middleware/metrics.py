@@ -0,0 +1,77 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.instrumentation import track_queries
+from src.services.metrics import Registry, timings, server_timing_header
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request counts by status class, latency histograms,
+    in-flight gauges and SQL statements per request (see src.database.instrumentation; the
+    QueryTrackingMiddleware inside it reuses this context). Routes are labelled with their path
+    template (e.g. /api/contacts/{contact_id}), found by matching the router's routes, so label
+    cardinality stays bounded.
+    With server_timing the response carries a Server-Timing header with the phases recorded
+    through src.services.metrics.timing (auth, db, serialization) and the total app time.
+    """
+
+    def __init__(self, app: ASGIApp, registry: Registry, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+        self.requests = registry.counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+        self.latency = registry.histogram("http_request_duration_seconds", "HTTP request latency",
+                                          ("method", "route"))
+        self.in_progress = registry.gauge("http_requests_in_progress", "HTTP requests being processed",
+                                          ("method", "route"))
+        self.queries = registry.histogram("http_request_db_queries", "SQL statements per HTTP request",
+                                          ("method", "route"), buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+
+    @staticmethod
+    def route_template(scope: Scope) -> str:
+        app = scope.get("app")
+        router = getattr(app, "router", None)
+        partial = UNMATCHED_ROUTE
+        for route in getattr(router, "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial == UNMATCHED_ROUTE:
+                partial = route.path
+        return partial
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = self.route_template(scope)
+        status_code = 500
+        started = time.perf_counter()
+        phases: dict[str, float] = {}
+        token = timings.set(phases)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    total = dict(phases, total=time.perf_counter() - started)
+                    MutableHeaders(raw=message["headers"]).append("Server-Timing", server_timing_header(total))
+            await send(message)
+
+        self.in_progress.inc(method=method, route=route)
+        try:
+            with track_queries() as queries:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            timings.reset(token)
+            self.in_progress.dec(method=method, route=route)
+            self.queries.observe(queries.count, method=method, route=route)
+            self.latency.observe(time.perf_counter() - started, method=method, route=route)
+            self.requests.inc(method=method, route=route, status=f"{status_code // 100}xx")
@@ -0,0 +1,22 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.database.instrumentation import current_queries, track_queries
+
+
+class QueryTrackingMiddleware:
+    """
+    Pure ASGI middleware attributing the SQL statements of each request to one QueryStats
+    (see src.database.instrumentation), which is what the per-request N+1 warning counts against.
+    It is installed whether or not metrics are enabled; when an outer middleware (MetricsMiddleware)
+    already tracks the request, that context is kept so the histogram sees the same statements.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or current_queries.get() is not None:
+            await self.app(scope, receive, send)
+            return
+        with track_queries():
+            await self.app(scope, receive, send)
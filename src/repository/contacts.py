@@ -1,39 +1,200 @@
-from sqlalchemy import select
+import re
+from datetime import datetime, date, timedelta
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import select, tuple_, insert, update, delete, RowMapping, func, or_, literal_column, text, table, \
+    column, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from src.entity.models import Contact, User
+from src.entity.models import Contact, User, SEARCH_DOCUMENT_SQL, SEARCH_VECTOR_SQL, SEARCH_FTS_TABLE, month_day
 from src.schemas.contact import ContactSchema, ContactUpdateSchema
+from src.services.cache import contact_list_cache
+
+EXPORT_COLUMNS = (
+    Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone_number, Contact.birthday,
+    Contact.extra_info, Contact.completed, Contact.created_at, Contact.updated_at,
+)
+CONTACT_FIELDS = {column.key: column for column in EXPORT_COLUMNS}
+contact_owner = aliased(User, name="user")
+
+
+def _select_fields(fields: list[str] | None, include_user: bool):
+    """
+    Column-only SELECT of the requested contact fields (all of them by default; id is always included).
+    The owner is joined only when include_user is set, and comes back as the row's user attribute.
+    """
+    names = ["id"] + [name for name in (fields or CONTACT_FIELDS) if name != "id"]
+    stmt = select(*(CONTACT_FIELDS[name] for name in names))
+    if include_user:
+        stmt = stmt.add_columns(contact_owner).outerjoin(contact_owner, Contact.user)
+    return stmt
 
 
-async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User):
+def _user_page(stmt, user: User, limit: int, offset: int, after: tuple[int, int] | None):
+    """
+    Restricts stmt to one page of the user's contacts, in (user_id, id) order.
+    """
+    stmt = stmt.where(Contact.user_id == user.id).order_by(Contact.user_id, Contact.id).limit(limit)
+    if after is None:
+        return stmt.offset(offset)
+    return stmt.where(tuple_(Contact.user_id, Contact.id) > tuple_(*after))
+
+
+async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User,
+                       after: tuple[int, int] | None = None, fields: list[str] | None = None,
+                       include_user: bool = False):
     """
     The get_contacts function returns a list of contacts for the user.
+    Rows are ordered by (user_id, id); when after is given the page starts right behind that key
+    and the offset is ignored, so the query seeks through the index instead of skipping rows.
+    Only the requested columns are selected, and users are joined only when include_user is set.
 
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the offset of the query
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Filter the contacts by user
-    :return: A list of contact objects
+    :param after: tuple[int, int] | None: (user_id, id) of the last contact of the previous page
+    :param fields: list[str] | None: Names from CONTACT_FIELDS to select, all of them if None
+    :param include_user: bool: Also return the owner of each contact as row.user
+    :return: A list of rows with the requested fields as attributes
     :doc-Author: Trelent
     """
-    stmt = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    stmt = _user_page(_select_fields(fields, include_user), user, limit, offset, after)
     contacts = await db.execute(stmt)
-    return contacts.scalars().all()
+    return contacts.all()
 
 
-async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
+async def get_all_contacts(limit: int, offset: int, db: AsyncSession, after: int | None = None,
+                           fields: list[str] | None = None, include_user: bool = False):
     """
     The get_all_contacts function returns a list of all contacts in the database.
+    Rows are ordered by id; when after is given the page starts right behind that id
+    and the offset is ignored.
 
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the offset of the query
     :param db: AsyncSession: Pass the database session to the function
-    :return: A list of contact objects
+    :param after: int | None: id of the last contact of the previous page
+    :param fields: list[str] | None: Names from CONTACT_FIELDS to select, all of them if None
+    :param include_user: bool: Also return the owner of each contact as row.user
+    :return: A list of rows with the requested fields as attributes
     :doc-Author: Trelent
 
     """
-    stmt = select(Contact).offset(offset).limit(limit)
+    stmt = _select_fields(fields, include_user).order_by(Contact.id).limit(limit)
+    if after is None:
+        stmt = stmt.offset(offset)
+    else:
+        stmt = stmt.where(Contact.id > after)
+    contacts = await db.execute(stmt)
+    return contacts.all()
+
+
+async def export_contacts(db: AsyncSession, user: User, batch_size: int) -> AsyncIterator[Sequence[RowMapping]]:
+    """
+    The export_contacts function streams all contacts of the user through a server-side cursor.
+    Only EXPORT_COLUMNS are selected and at most batch_size rows are buffered at a time.
+
+    Args:
+        db: AsyncSession: Session that stays open while the result is consumed
+        user: User: Owner of the contacts
+        batch_size: int: Number of rows fetched per round trip
+
+    Yields:
+        Lists of row mappings ordered by id
+
+    Doc Author:
+        Trelent
+    """
+    stmt = (select(*EXPORT_COLUMNS).where(Contact.user_id == user.id).order_by(Contact.id)
+            .execution_options(yield_per=batch_size))
+    result = await db.stream(stmt)
+    async for partition in result.mappings().partitions():
+        yield partition
+
+
+async def search_contacts(q: str, limit: int, offset: int, db: AsyncSession, user: User):
+    """
+    The search_contacts function finds the user's contacts whose first name, last name, email or phone
+    number match every word of the query, by word prefix or (on PostgreSQL) by substring, best matches first.
+
+    PostgreSQL uses the GIN indexes on the tsvector and pg_trgm expressions of the contacts table,
+    SQLite the contacts_fts FTS5 table; other databases fall back to ILIKE.
+
+    Args:
+        q: str: Search query
+        limit: int: Limit the number of contacts returned
+        offset: int: Specify the offset of the query
+        db: AsyncSession: Pass the database session to the function
+        user: User: Owner of the contacts
+
+    Returns:
+        A list of contact objects
+
+    Doc Author:
+        Trelent
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return []
+    stmt = select(Contact).where(Contact.user_id == user.id).limit(limit).offset(offset)
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        vector = literal_column(SEARCH_VECTOR_SQL)
+        document = literal_column(SEARCH_DOCUMENT_SQL)
+        tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{word}:*" for word in words))
+        pattern = "%" + re.sub(r"([!%_])", r"!\1", q.strip()) + "%"
+        rank = func.ts_rank(vector, tsquery) + func.similarity(document, q)
+        stmt = stmt.where(or_(vector.op("@@")(tsquery), document.ilike(bindparam("pattern", pattern), escape="!")))
+        stmt = stmt.order_by(rank.desc(), Contact.id)
+    elif dialect == "sqlite":
+        fts = table(SEARCH_FTS_TABLE, column("rowid"), column("rank"))
+        match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+        stmt = stmt.join(fts, fts.c.rowid == Contact.id)
+        stmt = stmt.where(text(f"{SEARCH_FTS_TABLE} MATCH :match").bindparams(match=match))
+        stmt = stmt.order_by(fts.c.rank, Contact.id)
+    else:
+        for word in words:
+            stmt = stmt.where(or_(Contact.first_name.ilike(f"%{word}%"), Contact.last_name.ilike(f"%{word}%"),
+                                  Contact.email.ilike(f"%{word}%"), Contact.phone_number.ilike(f"%{word}%")))
+        stmt = stmt.order_by(Contact.id)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
+
+
+async def get_upcoming_birthdays(days: int, db: AsyncSession, user: User, today: date | None = None):
+    """
+    The get_upcoming_birthdays function returns the user's contacts whose birthday falls within
+    the next days days (today included), nearest first. The comparison runs on month/day in SQL,
+    wraps around the end of the year and is served by the (user_id, month_day(birthday)) index.
+
+    Args:
+        days: int: Size of the window in days
+        db: AsyncSession: Pass the database session to the function
+        user: User: Owner of the contacts
+        today: date | None: First day of the window, defaults to the current date
+
+    Returns:
+        A list of contact objects
+
+    Doc Author:
+        Trelent
+    """
+    today = today or date.today()
+    last = today + timedelta(days=days - 1)
+    start = today.month * 100 + today.day
+    end = last.month * 100 + last.day
+    birthday = month_day(Contact.birthday)
+    stmt = select(Contact).where(Contact.user_id == user.id)
+    if days >= 366:
+        stmt = stmt.where(Contact.birthday.is_not(None))
+    elif start <= end and last.year == today.year:
+        stmt = stmt.where(birthday.between(start, end))
+    else:
+        stmt = stmt.where(or_(birthday >= start, birthday <= end))
+    stmt = stmt.order_by((birthday < start), birthday, Contact.id)
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
@@ -53,11 +214,55 @@ async def get_contact(contact_id: int, db: AsyncSession, user: User):
     Doc Author:
         Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
+    stmt = select(Contact).filter_by(id=contact_id, user=user).options(joinedload(Contact.user))
     contact = await db.execute(stmt)
     return contact.scalar_one_or_none()
 
 
+async def get_contact_version(contact_id: int, db: AsyncSession, user: User):
+    """
+    The get_contact_version function reads only what the ETag of a contact is built from.
+
+    Args:
+        contact_id: int: Contact to look up
+        db: AsyncSession: Pass the database session to the function
+        user: User: Owner of the contact
+
+    Returns:
+        A row with id and updated_at, or None if the user has no such contact
+
+    Doc Author:
+        Trelent
+    """
+    stmt = select(Contact.id, Contact.updated_at).where(Contact.id == contact_id, Contact.user_id == user.id)
+    result = await db.execute(stmt)
+    return result.one_or_none()
+
+
+async def get_contacts_page_version(limit: int, offset: int, db: AsyncSession, user: User,
+                                    after: tuple[int, int] | None = None):
+    """
+    The get_contacts_page_version function reads only what the ETag of a page of the user's contacts is
+        built from: the id and updated_at of the contacts get_contacts would return.
+
+    Args:
+        limit: int: Page size
+        offset: int: Number of contacts to skip (when after is None)
+        db: AsyncSession: Pass the database session to the function
+        user: User: Owner of the contacts
+        after: tuple[int, int] | None: (user_id, id) of the last contact of the previous page
+
+    Returns:
+        Rows with id and updated_at
+
+    Doc Author:
+        Trelent
+    """
+    stmt = _user_page(select(Contact.id, Contact.updated_at), user, limit, offset, after)
+    result = await db.execute(stmt)
+    return result.all()
+
+
 async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
     """
     The create_contact function creates a new contact in the database.
@@ -76,44 +281,88 @@ async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
     contact = Contact(**body.model_dump(exclude_unset=True), user=user)
     db.add(contact)
     await db.commit()
+    await contact_list_cache.bump(user.id)
     await db.refresh(contact)
+    set_committed_value(contact, "user", user)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactUpdateSchema, db: AsyncSession, user: User):
+async def create_contacts(rows: list[dict], db: AsyncSession, user: User) -> int:
+    """
+    The create_contacts function inserts a batch of already validated contacts in one statement.
+    On PostgreSQL (asyncpg) the rows are loaded with COPY, elsewhere with a multi-row executemany INSERT.
+
+    Args:
+        rows: list[dict]: Contact fields, as dumped from ContactSchema
+        db: AsyncSession: Pass in the database session
+        user: User: Owner of the new contacts
+
+    Returns:
+        The number of inserted contacts
+
+    Doc Author:
+        Trelent
+    """
+    if not rows:
+        return 0
+    if db.bind.dialect.name == "postgresql" and db.bind.dialect.driver == "asyncpg":
+        now = datetime.now()
+        columns = list(rows[0]) + ["created_at", "updated_at", "user_id"]
+        records = [tuple(row.values()) + (now, now, user.id) for row in rows]
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Contact.__tablename__, records=records, columns=columns
+        )
+    else:
+        await db.execute(insert(Contact), [dict(row, user_id=user.id) for row in rows])
+    await db.commit()
+    await contact_list_cache.bump(user.id)
+    return len(rows)
+
+
+async def update_contact(contact_id: int, body: ContactUpdateSchema, db: AsyncSession, user: User,
+                         unmodified_since: datetime | None = None):
     """
     The update_contact function updates a contact in the database.
+    Only the fields that were sent are written (None is ignored for required columns), in a single
+    ownership-scoped UPDATE ... RETURNING statement.
 
     Args:
         contact_id: int: Identify the contact to be updated
         body: ContactUpdateSchema: Validate the body of the request
         db: AsyncSession: Create a database session
         user: User: Ensure that the user is only updating their own contacts
+        unmodified_since: datetime | None: Only update if the contact still has this updated_at
 
     Returns:
-        A contact object
+        A contact object, or None if the user has no such contact
 
     Doc Author:
         Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
+    columns = Contact.__table__.c
+    values = {key: value for key, value in body.model_dump(exclude_unset=True).items()
+              if value is not None or columns[key].nullable}
+    if not values:
+        return await get_contact(contact_id, db, user)
+    stmt = (update(Contact).where(Contact.id == contact_id, Contact.user_id == user.id).values(**values)
+            .returning(Contact).execution_options(synchronize_session=False))
+    if unmodified_since is not None:
+        stmt = stmt.where(Contact.updated_at == unmodified_since)
     result = await db.execute(stmt)
     contact = result.scalar_one_or_none()
+    await db.commit()
     if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone_number = body.phone_number
-        contact.birthday = body.birthday
-        contact.extra_info = body.extra_info
-        await db.commit()
-        await db.refresh(contact)
+        await contact_list_cache.bump(user.id)
+        set_committed_value(contact, "user", user)
     return contact
 
 
 async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     """
-    The delete_contact function deletes a contact from the database.
+    The delete_contact function deletes a contact from the database
+    with a single ownership-scoped DELETE ... RETURNING statement.
 
     Args:
         contact_id: int: Specify the contact to delete
@@ -121,16 +370,16 @@ async def delete_contact(contact_id: int, db: AsyncSession, user: User):
         user: User: Ensure that the user is only deleting their own contacts
 
     Returns:
-        A contact object
+        The deleted contact object, or None if the user has no such contact
 
     Doc Author:
         Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    contact = await db.execute(stmt)
-    contact = contact.scalar_one_or_none()
+    stmt = (delete(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+            .returning(Contact).execution_options(synchronize_session=False))
+    result = await db.execute(stmt)
+    contact = result.scalar_one_or_none()
+    await db.commit()
     if contact:
-        await db.delete(contact)
-        await db.commit()
+        await contact_list_cache.bump(user.id)
     return contact
-
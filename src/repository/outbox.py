@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+from typing import Sequence
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import EmailOutbox, OutboxStatus
+
+
+async def enqueue_email(recipient: str, subject: str, template: str, context: dict, db: AsyncSession,
+                        commit: bool = True) -> EmailOutbox:
+    """
+    The enqueue_email function stores an email for the email worker and commits it, so the email
+        survives a restart of the web worker that requested it. With commit=False the entry is only
+        flushed, so the caller commits it in the same transaction as the change that caused it.
+
+    Args:
+        recipient: str: Email address of the recipient
+        subject: str: Subject line
+        template: str: Name of the template in the email template folder
+        context: dict: JSON-serializable template variables
+        db: AsyncSession: Database session
+        commit: bool: Commit the entry, instead of leaving that to the caller
+
+    Returns:
+        The outbox entry
+    """
+    now = datetime.utcnow()
+    entry = EmailOutbox(recipient=recipient, subject=subject, template=template, context=context,
+                        status=OutboxStatus.pending, attempts=0, created_at=now, next_attempt_at=now)
+    db.add(entry)
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    return entry
+
+
+async def claim_batch(limit: int, lease_seconds: int, db: AsyncSession) -> Sequence[EmailOutbox]:
+    """
+    The claim_batch function takes the oldest due pending emails and leases them to the caller by moving
+        their next_attempt_at past the lease. Rows locked by another worker are skipped on PostgreSQL;
+        if a worker dies mid-batch, its emails become due again when the lease runs out.
+
+    Args:
+        limit: int: Maximum number of emails
+        lease_seconds: int: Time the caller has to send them before another worker may
+        db: AsyncSession: Database session
+
+    Returns:
+        The claimed outbox entries, oldest first
+    """
+    now = datetime.utcnow()
+    stmt = (
+        select(EmailOutbox)
+        .where(EmailOutbox.status == OutboxStatus.pending, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    entries = (await db.execute(stmt)).scalars().all()
+    if entries:
+        await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_([entry.id for entry in entries]))
+            .values(next_attempt_at=now + timedelta(seconds=lease_seconds))
+        )
+    await db.commit()
+    return entries
+
+
+async def mark_sent(ids: list[int], db: AsyncSession) -> None:
+    if not ids:
+        return
+    await db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids))
+        .values(status=OutboxStatus.sent, sent_at=datetime.utcnow(), attempts=EmailOutbox.attempts + 1,
+                last_error=None)
+    )
+    await db.commit()
+
+
+async def mark_failed(entry_id: int, error: str, retry_at: datetime | None, db: AsyncSession) -> None:
+    """
+    The mark_failed function records a failed attempt: the email is retried at retry_at, or given up
+        (status failed) when retry_at is None.
+    """
+    values = {"attempts": EmailOutbox.attempts + 1, "last_error": error[:255]}
+    if retry_at is None:
+        values["status"] = OutboxStatus.failed
+    else:
+        values["next_attempt_at"] = retry_at
+    await db.execute(update(EmailOutbox).where(EmailOutbox.id == entry_id).values(**values))
+    await db.commit()
+
+
+async def outbox_stats(db: AsyncSession) -> dict:
+    """
+    The outbox_stats function reports the queue: pending and failed emails and the lag, i.e. the age of
+        the oldest pending email in seconds (0 when the queue is empty). Sent emails are not read, so
+        the cost follows the queue, not the history; the status index covers the filter.
+    """
+    stmt = select(EmailOutbox.status, func.count(EmailOutbox.id), func.min(EmailOutbox.created_at)) \
+        .where(EmailOutbox.status.in_((OutboxStatus.pending, OutboxStatus.failed))) \
+        .group_by(EmailOutbox.status)
+    rows = {status: (count, oldest) for status, count, oldest in await db.execute(stmt)}
+    pending, oldest = rows.get(OutboxStatus.pending, (0, None))
+    return {
+        "pending": pending,
+        "failed": rows.get(OutboxStatus.failed, (0, None))[0],
+        "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
+
+
+async def purge_sent(older_than: datetime, db: AsyncSession) -> int:
+    """
+    The purge_sent function deletes the emails sent before older_than. Failed emails are kept for
+        inspection.
+
+    Args:
+        older_than: datetime: Emails sent before this time are deleted
+        db: AsyncSession: Database session
+
+    Returns:
+        The number of deleted emails
+    """
+    result = await db.execute(
+        delete(EmailOutbox).where(EmailOutbox.status == OutboxStatus.sent, EmailOutbox.sent_at < older_than)
+    )
+    await db.commit()
+    return result.rowcount
@@ -1,11 +1,12 @@
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from libgravatar import Gravatar
 
 from src.database.db import get_db
 from src.entity.models import User
 from src.schemas.user import UserSchema
+from src.services.cache import principal_cache, contact_list_cache
 
 
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
@@ -15,7 +16,7 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     return user
 
 
-async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
+async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db), commit: bool = True):
     avatar = None
     try:
         g = Gravatar(body.email)
@@ -25,6 +26,9 @@ async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
 
     new_user = User(**body.model_dump(), avatar=avatar)
     db.add(new_user)
+    if not commit:
+        await db.flush()
+        return new_user
     await db.commit()
     await db.refresh(new_user)
     return new_user
@@ -33,17 +37,28 @@ async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
 async def update_token(user: User, token: str | None, db: AsyncSession):
     user.refresh_token = token
     await db.commit()
+    await principal_cache.invalidate(user.email)
+
+
+async def update_password(user: User, password: str, db: AsyncSession) -> None:
+    user.password = password
+    await db.commit()
 
 
 async def confirmed_email(email: str, db: AsyncSession) -> None:
-    user = await get_user_by_email(email, db)
-    user.confirmed = True
+    result = await db.execute(update(User).where(User.email == email).values(confirmed=True).returning(User.id))
+    user_id = result.scalar_one_or_none()
     await db.commit()
+    await principal_cache.invalidate(email)
+    if user_id is not None:
+        await contact_list_cache.bump(user_id)
 
 
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
-    user = await get_user_by_email(email, db)
-    user.avatar = url
+    result = await db.execute(update(User).where(User.email == email).values(avatar=url).returning(User))
+    user = result.scalar_one()
     await db.commit()
-    await db.refresh(user)
+    await principal_cache.invalidate(email)
+    # cached ?include=user pages embed the owner, avatar included
+    await contact_list_cache.bump(user.id)
     return user
\ No newline at end of file
@@ -1,15 +1,24 @@
 import traceback
 
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Response, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from sqlalchemy.orm import Session
-from src.database.db import get_db
+from src.conf.config import config
+from src.database.db import get_db, get_session_maker
 from src.entity.models import User, Role
 from src.repository import contacts as repositories_contacts
-from src.schemas.contact import ContactSchema, ContactUpdateSchema, ContactResponse, ContactSearchSchema
+from src.schemas.contact import ContactSchema, ContactUpdateSchema, ContactResponse, ContactSearchSchema, \
+    ContactImportReport, ContactPatchSchema, ContactFieldsResponse
 from src.services.auth import auth_service
+from src.services import importer, exporter
+from src.services.cache import contact_list_cache
+from src.services.serialization import encode_contacts, JSON_MEDIA_TYPE
+from src.services.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from src.services.etag import contact_etag, list_validators, etag_matches, is_not_modified, has_conditions, \
+    validator_headers, not_modified, parse_http_date
 
 from src.services.roles import RoleAccess
 
@@ -18,18 +27,117 @@ router = APIRouter(prefix='/contacts', tags=['contacts'])
 access_to_route_all = RoleAccess([Role.admin, Role.moderator])
 
 
-@router.get("/", response_model=list[ContactResponse])
-async def get_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+def list_projection(fields: str | None = Query(None, description="Comma-separated contact fields to return"),
+                    include: str | None = Query(None, description="Set to 'user' to embed the owner of each contact")
+                    ) -> tuple[list[str] | None, bool]:
+    """
+    The list_projection function parses the sparse fieldset parameters of the list routes.
+
+    Args:
+        fields: str | None: Comma-separated names of contact fields; all fields if omitted
+        include: str | None: user, or nothing
+
+    Returns:
+        (field names or None, whether to include the user)
+    """
+    names = None
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = sorted(set(names) - set(repositories_contacts.CONTACT_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown fields: {', '.join(unknown)}")
+    if include not in (None, "", "user"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="include supports only 'user'")
+    return names, include == "user"
+
+
+@router.get("/", response_model=list[ContactFieldsResponse], response_model_exclude_unset=True)
+async def get_contacts(request: Request, limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+                       cursor: str | None = Query(None),
+                       projection: tuple[list[str] | None, bool] = Depends(list_projection),
                        db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
-    contacts = await repositories_contacts.get_contacts(limit, offset, db, user)
-    return contacts
+    """
+    The get_contacts function returns a page of the current user's contacts.
+        Pages can be addressed by offset, or by the opaque cursor taken from the X-Next-Cursor
+        header of the previous page; in cursor mode the offset is ignored and every page costs the same.
+        The ETag / Last-Modified of a page come from the id and updated_at of its contacts; for a
+        conditional request only those are read first, so a matching If-None-Match or
+        If-Modified-Since gets 304 without loading the page.
+        With CONTACT_LIST_CACHE_ENABLED the rendered page is kept in Redis under the user's version
+        counter (bumped by every write), and a hit is answered without touching the database.
+
+    Args:
+        request: Request: Read the conditional request headers
+        limit: int: Page size
+        offset: int: Number of contacts to skip (offset mode only)
+        cursor: str | None: Cursor of the previous page
+        projection: tuple[list[str] | None, bool]: Requested fields (?fields=) and ?include=user
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user
 
+    Returns:
+        The JSON page of contacts with the requested fields, encoded directly from the rows
+    """
+    fields, include_user = projection
+    after = decode_cursor(cursor, 2) if cursor else None
+    query = str(request.query_params)
+    # pages with the owner embedded also change with the owner
+    scope = f"{user.id}|{user.username}|{user.avatar}|{user.role}" if include_user else str(user.id)
+    cache_version, cached = await contact_list_cache.get(user.id, query)
+    if cached is not None:
+        headers, body = cached
+        last_modified = parse_http_date(headers.get("Last-Modified"))
+        if is_not_modified(request, headers["ETag"], last_modified):
+            return not_modified(headers["ETag"], last_modified)
+        return Response(body, media_type=JSON_MEDIA_TYPE, headers=headers)
+    page = None
+    if has_conditions(request):
+        page = await repositories_contacts.get_contacts_page_version(limit, offset, db, user, after=after)
+        etag, last_modified = list_validators(scope, query, page)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+    contacts = await repositories_contacts.get_contacts(limit, offset, db, user, after=after, fields=fields,
+                                                        include_user=include_user)
+    if page is None:
+        page = contacts if fields is None or "updated_at" in fields else \
+            await repositories_contacts.get_contacts_page_version(limit, offset, db, user, after=after)
+    headers = validator_headers(*list_validators(scope, query, page))
+    if len(contacts) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(user.id, contacts[-1].id)
+    body = encode_contacts(contacts)
+    if cache_version is not None:
+        await contact_list_cache.set(user.id, cache_version, query, headers, body)
+    return Response(body, media_type=JSON_MEDIA_TYPE, headers=headers)
 
-@router.get("/all", response_model=list[ContactResponse], dependencies=[Depends(access_to_route_all)])
+
+@router.get("/all", response_model=list[ContactFieldsResponse], response_model_exclude_unset=True,
+            dependencies=[Depends(access_to_route_all)])
 async def get_all_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+                           cursor: str | None = Query(None),
+                           projection: tuple[list[str] | None, bool] = Depends(list_projection),
                            db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
-    contacts = await repositories_contacts.get_all_contacts(limit, offset, db)
-    return contacts
+    """
+    The get_all_contacts function returns a page of all contacts, ordered by id.
+        Supports the same offset, cursor and field selection modes as get_contacts.
+
+    Args:
+        limit: int: Page size
+        offset: int: Number of contacts to skip (offset mode only)
+        cursor: str | None: Cursor of the previous page
+        projection: tuple[list[str] | None, bool]: Requested fields (?fields=) and ?include=user
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user
+
+    Returns:
+        The JSON page of contacts with the requested fields, encoded directly from the rows
+    """
+    fields, include_user = projection
+    after = decode_cursor(cursor, 1)[0] if cursor else None
+    contacts = await repositories_contacts.get_all_contacts(limit, offset, db, after=after, fields=fields,
+                                                            include_user=include_user)
+    headers = {NEXT_CURSOR_HEADER: encode_cursor(contacts[-1].id)} if len(contacts) == limit else None
+    return Response(encode_contacts(contacts), media_type=JSON_MEDIA_TYPE, headers=headers)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
@@ -41,53 +149,200 @@ async def create_contact(body: ContactSchema, db: AsyncSession = Depends(get_db)
     return contact
 
 
+@router.post("/bulk", response_model=ContactImportReport)
+async def import_contacts(request: Request, batch_size: int = Query(config.CONTACT_IMPORT_BATCH_SIZE, ge=1, le=10000),
+                          db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function bulk-creates contacts from a streamed NDJSON or CSV request body.
+        The body is parsed and validated row by row and inserted in batches, so memory use does not
+        depend on the number of rows. Invalid rows are skipped and listed in the report.
+
+    Args:
+        request: Request: Read the body stream and its Content-Type
+            (application/x-ndjson, or text/csv with a header line)
+        batch_size: int: Number of contacts per insert
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Owner of the imported contacts
+
+    Returns:
+        The import report
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in importer.NDJSON_TYPES:
+        rows = importer.iter_ndjson(request.stream())
+    elif content_type in importer.CSV_TYPES:
+        rows = importer.iter_csv(request.stream())
+    else:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Expected application/x-ndjson or text/csv")
+    return await importer.import_contacts(rows, db, user, batch_size, config.CONTACT_IMPORT_MAX_ERRORS)
+
+
+@router.get("/search", response_model=list[ContactResponse])
+async def search_contacts(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=10, le=500),
+                          offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db),
+                          user: User = Depends(auth_service.get_current_user)):
+    """
+    The search_contacts function searches the current user's contacts by first name, last name, email
+        and phone number. Every word of q must match the start of a word in one of these fields;
+        results are ranked by relevance.
+
+    Args:
+        q: str: Search query
+        limit: int: Page size
+        offset: int: Number of results to skip
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user
+
+    Returns:
+        A list of contacts
+    """
+    contacts = await repositories_contacts.search_contacts(q, limit, offset, db, user)
+    return Response(encode_contacts(contacts), media_type=JSON_MEDIA_TYPE)
+
+
+@router.get("/birthdays", response_model=list[ContactResponse])
+async def get_upcoming_birthdays(days: int = Query(7, ge=1, le=366), db: AsyncSession = Depends(get_db),
+                                 user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_upcoming_birthdays function returns the current user's contacts with a birthday
+        in the next days days, today included, nearest first.
+
+    Args:
+        days: int: Size of the window in days
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user
+
+    Returns:
+        A list of contacts
+    """
+    contacts = await repositories_contacts.get_upcoming_birthdays(days, db, user)
+    return Response(encode_contacts(contacts), media_type=JSON_MEDIA_TYPE)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_contacts(format: Literal["ndjson", "csv"] = Query("ndjson"),
+                          session_maker: async_sessionmaker = Depends(get_session_maker),
+                          user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams the full contact book of the current user as NDJSON or CSV.
+        Rows come from a server-side cursor in batches of CONTACT_EXPORT_BATCH_SIZE and are written
+        to the client as they arrive, so memory use does not depend on the number of contacts.
+
+    Args:
+        format: str: ndjson or csv
+        session_maker: async_sessionmaker: Open a session that lives as long as the response
+        user: User: Owner of the contacts
+
+    Returns:
+        A streaming response with the contacts ordered by id
+    """
+    columns = [column.key for column in repositories_contacts.EXPORT_COLUMNS]
+
+    async def body():
+        header = True
+        async with session_maker() as session:
+            async for rows in repositories_contacts.export_contacts(session, user, config.CONTACT_EXPORT_BATCH_SIZE):
+                if format == "csv":
+                    yield exporter.encode_csv(rows, columns, header=header)
+                    header = False
+                else:
+                    yield exporter.encode_ndjson(rows)
+        if format == "csv" and header:
+            yield exporter.encode_csv([], columns, header=True)
+
+    media_type = exporter.CSV_MEDIA_TYPE if format == "csv" else exporter.NDJSON_MEDIA_TYPE
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'})
+
+
 @router.get("/{contact_id}", response_model=ContactResponse)
-async def get_contact(contact_id: int = Path(..., ge=1), db: AsyncSession = Depends(get_db),
-                      user: User = Depends(auth_service.get_current_user)):
-    try:
-        contact = await repositories_contacts.get_contact(contact_id, db, user)
-        if not contact:
+async def get_contact(request: Request, response: Response, contact_id: int = Path(..., ge=1),
+                      db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_contact function returns one contact of the current user with its ETag and Last-Modified.
+        For conditional requests only id and updated_at are read first; if the client's copy is current
+        the answer is 304 and the contact itself is never loaded.
+
+    Args:
+        request: Request: Read the conditional request headers
+        response: Response: Set the ETag and Last-Modified headers
+        contact_id: int: Contact to return
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user
+
+    Returns:
+        The contact
+    """
+    if has_conditions(request):
+        version = await repositories_contacts.get_contact_version(contact_id, db, user)
+        if version is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-        return contact
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        etag = contact_etag(version.id, version.updated_at)
+        if is_not_modified(request, etag, version.updated_at):
+            return not_modified(etag, version.updated_at)
+    contact = await repositories_contacts.get_contact(contact_id, db, user)
+    if not contact:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    response.headers.update(validator_headers(contact_etag(contact.id, contact.updated_at), contact.updated_at))
+    return contact
 
 
-@router.put("/{contact_id}")
-async def update_contact(body: ContactUpdateSchema, contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
-                         user: User = Depends(auth_service.get_current_user)):
-    contact = await repositories_contacts.update_contact(contact_id, body, db, user)
+async def _update_contact(contact_id: int, body: ContactUpdateSchema, request: Request, response: Response,
+                          db: AsyncSession, user: User):
+    """
+    Shared body of PUT and PATCH. With If-Match the update only goes through while the contact still has
+    the given ETag (the UPDATE is also conditioned on its updated_at), otherwise the answer is 412.
+    """
+    if_match = request.headers.get("if-match")
+    unmodified_since = None
+    if if_match is not None:
+        version = await repositories_contacts.get_contact_version(contact_id, db, user)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+        if not etag_matches(if_match, contact_etag(version.id, version.updated_at)):
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Contact was modified")
+        unmodified_since = version.updated_at
+    contact = await repositories_contacts.update_contact(contact_id, body, db, user, unmodified_since=unmodified_since)
     if contact is None:
+        if if_match is not None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Contact was modified")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    response.headers.update(validator_headers(contact_etag(contact.id, contact.updated_at), contact.updated_at))
     return contact
 
 
+@router.put("/{contact_id}", response_model=ContactResponse)
+async def update_contact(body: ContactUpdateSchema, request: Request, response: Response,
+                         contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+                         user: User = Depends(auth_service.get_current_user)):
+    return await _update_contact(contact_id, body, request, response, db, user)
+
+
+@router.patch("/{contact_id}", response_model=ContactResponse)
+async def patch_contact(body: ContactPatchSchema, request: Request, response: Response,
+                        contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+                        user: User = Depends(auth_service.get_current_user)):
+    """
+    The patch_contact function changes only the fields present in the request body.
+        Send If-Match with the contact's ETag to prevent overwriting someone else's change.
+
+    Args:
+        body: ContactPatchSchema: Fields to change
+        request: Request: Read the If-Match header
+        response: Response: Set the new ETag and Last-Modified headers
+        contact_id: int: Contact to change
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Current user, owner of the contact
+
+    Returns:
+        The updated contact
+    """
+    return await _update_contact(contact_id, body, request, response, db, user)
+
+
 @router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                          user: User = Depends(auth_service.get_current_user)):
     contact = await repositories_contacts.delete_contact(contact_id, db, user)
     return contact
-
-# @router.get("/search", response_model=List[ContactResponse])
-# async def search_contacts(
-#     first_name: str = None,
-#     # last_name: str = None,
-#     # email: str = None,
-#     # skip: int = 0,
-#     # limit: int = Query(default=10, le=100, ge=10),
-#     db: Session = Depends(get_db),
-# ):
-#     contacts = None
-#     # if first_name or last_name or email:
-#     if first_name:
-#         param = {
-#             "first_name": first_name,
-#             # "last_name": last_name,
-#             # "email": email,
-#             # "skip": skip,
-#             # "limit": limit,
-#         }
-#         contacts = await repositories_contacts.search_contacts(param, db)
-#     if contacts is None:
-#         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-#     return contacts
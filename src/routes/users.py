@@ -1,7 +1,3 @@
-import pickle
-
-import cloudinary
-import cloudinary.uploader
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -12,7 +8,6 @@ from fastapi import (
     UploadFile,
     File,
 )
-from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
@@ -21,21 +16,19 @@ from src.schemas.user import UserResponse
 from src.services.auth import auth_service
 from src.conf.config import config
 from src.repository import users as repositories_users
+from src.services.avatars import AvatarPipeline, AvatarTooLarge, InvalidAvatar, AvatarProcessingUnavailable
+from src.services.rate_limit import RateLimiter
+from src.services.storage import create_storage
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-cloudinary.config(
-    cloud_name=config.CLD_NAME,
-    api_key=config.CLD_API_KEY,
-    api_secret=config.CLD_API_SECRET,
-    secure=True,
-)
+avatar_pipeline = AvatarPipeline(create_storage(config), config.AVATAR_MAX_BYTES)
 
 
 @router.get(
     "/me",
     response_model=UserResponse,
-    dependencies=[Depends(RateLimiter(times=1, seconds=20))],
+    dependencies=[Depends(RateLimiter(times=1, seconds=20, name="users:me"))],
 )
 async def get_current_user(user: User = Depends(auth_service.get_current_user)):
     return user
@@ -44,20 +37,22 @@ async def get_current_user(user: User = Depends(auth_service.get_current_user)):
 @router.patch(
     "/avatar",
     response_model=UserResponse,
-    dependencies=[Depends(RateLimiter(times=1, seconds=20))],
+    dependencies=[Depends(RateLimiter(times=1, seconds=20, name="users:avatar"))],
 )
 async def get_current_user(
         file: UploadFile = File(),
         user: User = Depends(auth_service.get_current_user),
         db: AsyncSession = Depends(get_db),
 ):
-    public_id = f"Web19/{user.email}"
-    res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
-    print(res)
-    res_url = cloudinary.CloudinaryImage(public_id).build_url(
-        width=250, height=250, crop="fill", version=res.get("version")
-    )
-    user = await repositories_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
+    try:
+        url = await avatar_pipeline.store(file, user.id, user.avatar)
+    except AvatarTooLarge as err:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(err))
+    except InvalidAvatar as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    except AvatarProcessingUnavailable as err:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(err))
+    if url == user.avatar:
+        return user
+    user = await repositories_users.update_avatar_url(user.email, url, db)
     return user
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional
 
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
@@ -11,7 +11,7 @@ class ContactSchema(BaseModel):
     last_name: str = Field(min_length=3, max_length=20)
     email: EmailStr = Field(min_length=3, max_length=40)
     phone_number: str = Field(max_length=20)
-    birthday: str = Field(max_length=20)
+    birthday: date
     extra_info: str = Field(min_length=3, max_length=250)
     completed: Optional[bool] = False
 
@@ -21,27 +21,61 @@ class ContactUpdateSchema(ContactSchema):
     last_name: Optional[str] = Field(None, min_length=3, max_length=20)
     email: Optional[EmailStr] = Field(None, min_length=3, max_length=40)
     phone_number: Optional[str] = Field(None, max_length=20)
-    birthday: Optional[str] = Field(None, max_length=20)  # Теж використовуємо str для строки
+    birthday: Optional[date] = None
     extra_info: Optional[str] = Field(None, min_length=3, max_length=250)
     completed: bool
 
 
+class ContactPatchSchema(ContactUpdateSchema):
+    completed: Optional[bool] = None
+
+
 class ContactResponse(BaseModel):
     id: int = 1
     first_name: str
     last_name: str
     email: str
     phone_number: str
-    birthday: str
+    birthday: date | None
     extra_info: str
     completed: bool
     created_at: datetime | None
     updated_at: datetime | None
-    user: UserResponse | None
+    user: UserResponse | None = None
     model_config = ConfigDict(from_attributes = True)  # noqa
     # user: UserRead | None
 
 
+class ContactFieldsResponse(BaseModel):
+    """
+    Contact with only the requested fields; list routes return it with response_model_exclude_unset,
+    so fields that were not selected are left out of the JSON.
+    """
+    id: int
+    first_name: str | None = None
+    last_name: str | None = None
+    email: str | None = None
+    phone_number: str | None = None
+    birthday: date | None = None
+    extra_info: str | None = None
+    completed: bool | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    user: UserResponse | None = None
+    model_config = ConfigDict(from_attributes = True)  # noqa
+
+
+
+class ContactImportError(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ContactImportReport(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    errors: list[ContactImportError] = []
+
 
 class ContactSearchSchema(BaseModel):
     first_name: str
@@ -1,10 +1,9 @@
-import pickle
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
@@ -12,19 +11,27 @@ from jose import JWTError, jwt
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.conf.config import config
+from src.services.cache import principal_cache, LRUCache
+from src.services.hashing import password_hasher
+from src.services.metrics import timing
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hasher = password_hasher
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
-    cache = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    cache = principal_cache
+    token_cache = LRUCache(config.TOKEN_CACHE_SIZE, config.TOKEN_CACHE_TTL)
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password, hashed_password):
+        verified, _ = await self.hasher.verify_and_update(plain_password, hashed_password)
+        return verified
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        return await self.hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
+        return await self.hasher.hash(password)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -60,6 +67,30 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
+    def decode_access_token(self, token: str) -> dict:
+        """
+        The decode_access_token function verifies a JWT and returns its claims.
+            Verified claims are cached per worker under the SHA-256 digest of the token until
+            the token's exp at the latest, so repeated requests with the same token skip
+            signature verification; token_cache.hits and token_cache.misses count the outcomes.
+
+        Args:
+            token: str: Encoded JWT
+
+        Returns:
+            The token claims
+
+        Raises:
+            JWTError: If the token is invalid or expired
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        payload = self.token_cache.get(key)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            expires_in = payload.get("exp", 0) - time.time()
+            self.token_cache.set(key, payload, ttl=expires_in)
+        return payload
+
     async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,32 +98,27 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
+        with timing("auth"):
+            try:
+                # Decode JWT
+                payload = self.decode_access_token(token)
+                if payload.get('scope') == 'access_token':
+                    email = payload["sub"]
+                    if email is None:
+                        raise credentials_exception
+                else:
                     raise credentials_exception
-            else:
+            except JWTError as e:
                 raise credentials_exception
-        except JWTError as e:
-            raise credentials_exception
 
-        user_hash = str(email)
-        user = self.cache.get(user_hash)
+            user = await self.cache.get(email)
 
-        if user is None:
-            print("User from database")
-            user = await repository_users.get_user_by_email(email, db)
             if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 300)
-        else:
-            print("User from cache")
-            user = pickle.loads(user)
-        return user
+                user = await repository_users.get_user_by_email(email, db)
+                if user is None:
+                    raise credentials_exception
+                await self.cache.set(user)
+            return user
 
     def create_email_token(self, data: dict):
         to_encode = data.copy()
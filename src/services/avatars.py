@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import io
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+from src.services.storage import Storage
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # pragma: no cover - Pillow is a declared dependency
+    Image = None
+
+AVATAR_SIZE = 250
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+
+class AvatarTooLarge(ValueError):
+    pass
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+class AvatarProcessingUnavailable(RuntimeError):
+    pass
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> tuple[SpooledTemporaryFile, str]:
+    """
+    The spool_upload function copies an upload chunk by chunk into a spooled temporary file (in memory
+        up to 1 MiB, on disk beyond) and hashes it on the way.
+
+    Args:
+        file: UploadFile: The uploaded image
+        max_bytes: int: Largest accepted upload
+
+    Returns:
+        The spooled file, rewound, and the SHA-256 hex digest of its content
+
+    Raises:
+        AvatarTooLarge: If the upload is larger than max_bytes
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise AvatarTooLarge(f"Avatar is larger than {max_bytes} bytes")
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+
+def render_avatar(source: BinaryIO, size: int = AVATAR_SIZE) -> tuple[bytes, str]:
+    """
+    The render_avatar function crops an image to a centered size x size square and encodes it as WebP.
+        It is CPU-bound and meant to run in a thread.
+
+    Args:
+        source: BinaryIO: The uploaded image
+        size: int: Width and height of the avatar
+
+    Returns:
+        The encoded image and its content type
+
+    Raises:
+        InvalidAvatar: If the upload is not an image Pillow can read, or declares far more pixels
+            than Image.MAX_IMAGE_PIXELS (a decompression bomb)
+        AvatarProcessingUnavailable: If Pillow is not installed; uploads are never stored unprocessed
+    """
+    if Image is None:
+        raise AvatarProcessingUnavailable("Avatar processing is not available")
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=85, method=4)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as err:
+        raise InvalidAvatar("Unsupported image") from err
+    return output.getvalue(), "image/webp"
+
+
+class AvatarPipeline:
+    """
+    Upload -> spooled file and content hash -> resize and encode in a thread -> storage.
+
+    The storage key contains the hash of the uploaded bytes, so uploading the same image again is
+    answered from the user's current avatar or from the storage without processing or uploading it.
+    """
+
+    def __init__(self, storage: Storage, max_bytes: int):
+        self.storage = storage
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(user_id: int, digest: str) -> str:
+        return f"avatars/{user_id}/{digest[:32]}.webp"
+
+    async def store(self, file: UploadFile, user_id: int, current_url: str | None = None) -> str:
+        """
+        The store function processes an uploaded avatar and returns its url.
+
+        Args:
+            file: UploadFile: The uploaded image
+            user_id: int: Owner of the avatar
+            current_url: str | None: The current avatar url of the user
+
+        Returns:
+            The url of the avatar; current_url itself if the same image is uploaded again
+
+        Raises:
+            AvatarTooLarge: If the upload is larger than max_bytes
+            InvalidAvatar: If the upload is not an image
+            AvatarProcessingUnavailable: If Pillow is not installed
+        """
+        spool, digest = await spool_upload(file, self.max_bytes)
+        with spool:
+            key = self.key(user_id, digest)
+            if current_url and key.rsplit(".", 1)[0] in current_url:
+                return current_url
+            if await self.storage.exists(key):
+                return self.storage.url(key)
+            data, content_type = await asyncio.to_thread(render_avatar, spool, AVATAR_SIZE)
+        return await self.storage.save(key, data, content_type)
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.conf.config import config
+from src.entity.models import User, Role
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_VERSION = 1
+PRINCIPAL_TTL = 300
+PRINCIPAL_CHANNEL = "principal:invalidate"
+CONTACT_LIST_PREFIX = "contacts"
+PUBSUB_POLL_SECONDS = 30
+
+# Short timeouts: every caller of Redis falls back to a local path on RedisError, which is only useful if
+# an unreachable or stalled Redis fails fast instead of holding the request.
+pool = redis.ConnectionPool(
+    host=config.REDIS_DOMAIN,
+    port=config.REDIS_PORT,
+    db=0,
+    password=config.REDIS_PASSWORD,
+    max_connections=config.REDIS_MAX_CONNECTIONS,
+    socket_connect_timeout=config.REDIS_SOCKET_CONNECT_TIMEOUT,
+    socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+)
+redis_client = redis.Redis(connection_pool=pool)
+
+
+def principal_key(email: str) -> str:
+    """
+    The principal_key function builds the Redis key under which a user's principal is cached.
+
+    Args:
+        email: str: Email of the user
+
+    Returns:
+        The cache key
+    """
+    return f"principal:{email}"
+
+
+def dump_principal(user: User) -> bytes:
+    """
+    The dump_principal function serializes the fields of a user that authenticated requests need.
+        The password hash and tokens are never written to the cache.
+
+    Args:
+        user: User: The user loaded from the database
+
+    Returns:
+        Compact JSON bytes tagged with PRINCIPAL_VERSION
+    """
+    role = user.role.value if isinstance(user.role, Role) else user.role
+    data = {
+        "v": PRINCIPAL_VERSION,
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "avatar": user.avatar,
+        "role": role,
+        "confirmed": user.confirmed,
+    }
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def load_principal(raw: bytes) -> User | None:
+    """
+    The load_principal function rebuilds a user from bytes written by dump_principal.
+        The user is returned in the detached state, so it can be attached to a session
+        (e.g. as the owner of a new contact) without being inserted again.
+
+    Args:
+        raw: bytes: Cached value
+
+    Returns:
+        A detached user, or None if the value is unreadable or was written by another version
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("v") != PRINCIPAL_VERSION:
+        return None
+    user = User(
+        id=data["id"],
+        username=data["username"],
+        email=data["email"],
+        avatar=data["avatar"],
+        role=Role(data["role"]) if data["role"] else None,
+        confirmed=data["confirmed"],
+    )
+    make_transient_to_detached(user)
+    return user
+
+
+class LRUCache:
+    """
+    A bounded in-process cache with least-recently-used eviction and per-entry expiry.
+    Not shared between workers; it is only safe because every writer of the underlying
+    data broadcasts an invalidation (see PrincipalCache).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+class PrincipalCache:
+    """
+    Two-tier cache of authenticated users: a per-worker LRU in front of Redis.
+    Writers call invalidate(), which drops the Redis entry and publishes the email on
+    PRINCIPAL_CHANNEL; every worker runs listen() and evicts the email from its LRU.
+    Redis errors are logged and treated as misses, so auth keeps working without Redis.
+    """
+
+    def __init__(self, client: redis.Redis, local: LRUCache, channel: str = PRINCIPAL_CHANNEL):
+        self.client = client
+        self.local = local
+        self.channel = channel
+        self._listener: asyncio.Task | None = None
+
+    async def get(self, email: str) -> User | None:
+        raw = self.local.get(email)
+        if raw is None:
+            try:
+                raw = await self.client.get(principal_key(email))
+            except RedisError as err:
+                logger.warning("principal cache get failed: %s", err)
+                return None
+            if raw is None:
+                return None
+            self.local.set(email, raw)
+        return load_principal(raw)
+
+    async def set(self, user: User) -> None:
+        raw = dump_principal(user)
+        self.local.set(user.email, raw)
+        try:
+            await self.client.set(principal_key(user.email), raw, ex=PRINCIPAL_TTL)
+        except RedisError as err:
+            logger.warning("principal cache set failed: %s", err)
+
+    async def invalidate(self, email: str) -> None:
+        self.local.pop(email)
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                await pipe.delete(principal_key(email)).publish(self.channel, email).execute()
+        except RedisError as err:
+            logger.warning("principal cache invalidation failed: %s", err)
+
+    async def listen(self) -> None:
+        """
+        The listen function evicts local entries on invalidation messages until cancelled.
+            The local cache is cleared after every reconnect, because messages may have been missed.
+        """
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self.local.clear()
+                    while True:
+                        # an explicit timeout, because the socket timeout of the pool would end an idle read
+                        message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                           timeout=PUBSUB_POLL_SECONDS)
+                        if message is not None and message["type"] == "message":
+                            self.local.pop(message["data"].decode())
+            except RedisError as err:
+                logger.warning("principal cache listener disconnected: %s", err)
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+principal_cache = PrincipalCache(
+    redis_client, LRUCache(config.PRINCIPAL_CACHE_SIZE, config.PRINCIPAL_CACHE_TTL)
+)
+
+
+class VersionedResponseCache:
+    """
+    Cache of serialized responses namespaced by a per-owner version counter in Redis.
+    A reader gets the owner's version and then the page stored under that version; a writer
+    only increments the version after committing, so all pages of the owner are invalidated
+    with one INCR and the orphaned pages expire on their own. A page rendered from data that
+    was read before a bump is stored under the old version, which nobody reads any more.
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str, ttl: int, enabled: bool = True):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bumps = 0
+
+    def version_key(self, owner: Hashable) -> str:
+        return f"{self.prefix}:v:{owner}"
+
+    def page_key(self, owner: Hashable, version: int, query: str) -> str:
+        digest = hashlib.sha1(query.encode()).hexdigest()
+        return f"{self.prefix}:p:{owner}:{version}:{digest}"
+
+    async def get(self, owner: Hashable, query: str) -> tuple[int | None, tuple[dict, bytes] | None]:
+        """
+        The get function looks up the cached page for a query of an owner.
+
+        Args:
+            owner: Hashable: Owner of the data, usually the user id
+            query: str: Canonical query string of the request
+
+        Returns:
+            The owner's current version (None if the cache is disabled or unavailable)
+            and the cached (headers, body), or None on a miss
+        """
+        if not self.enabled:
+            return None, None
+        try:
+            version = int(await self.client.get(self.version_key(owner)) or 0)
+            raw = await self.client.get(self.page_key(owner, version, query))
+        except RedisError as err:
+            logger.warning("response cache get failed: %s", err)
+            self.errors += 1
+            return None, None
+        if raw is None:
+            self.misses += 1
+            return version, None
+        meta, _, body = raw.partition(b"\n")
+        self.hits += 1
+        return version, (json.loads(meta), body)
+
+    async def set(self, owner: Hashable, version: int, query: str, headers: dict, body: bytes) -> None:
+        raw = json.dumps(headers, separators=(",", ":")).encode() + b"\n" + body
+        try:
+            await self.client.set(self.page_key(owner, version, query), raw, ex=self.ttl)
+        except RedisError as err:
+            logger.warning("response cache set failed: %s", err)
+            self.errors += 1
+
+    async def bump(self, owner: Hashable) -> None:
+        """
+        The bump function invalidates every cached page of an owner; call it after the write is committed.
+        """
+        if not self.enabled:
+            return
+        try:
+            await self.client.incr(self.version_key(owner))
+            self.bumps += 1
+        except RedisError as err:
+            logger.warning("response cache bump failed: %s", err)
+            self.errors += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "bumps": self.bumps,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+contact_list_cache = VersionedResponseCache(
+    redis_client, CONTACT_LIST_PREFIX, config.CONTACT_LIST_CACHE_TTL, config.CONTACT_LIST_CACHE_ENABLED
+)
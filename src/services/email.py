@@ -1,10 +1,18 @@
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from jinja2 import Environment, FileSystemLoader, Template
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.entity.models import EmailOutbox
+from src.repository import outbox as repositories_outbox
 from src.services.auth import auth_service
+from src.services.metrics import registry
 from src.conf.config import config
 
 conf = ConnectionConfig(
@@ -21,18 +29,138 @@ conf = ConnectionConfig(
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
 
+VERIFY_EMAIL_TEMPLATE = "verify_email.html"
+VERIFY_EMAIL_SUBJECT = "Confirm your email "
 
-async def send_email(email: EmailStr, username: str, host: str):
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        print(err)
+template_render_duration = registry.histogram("email_template_render_seconds", "Email template render time",
+                                              labelnames=("template",),
+                                              buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+
+
+class EmailTemplates:
+    """
+    The email templates, parsed and compiled once and kept for the life of the process.
+
+    fastapi-mail builds a new jinja Environment for every message, so every email re-reads and
+    re-compiles its template. Here the environment is created once with auto_reload off (no stat()
+    of the file per render) and compile() loads every template up front, so rendering a template for
+    each recipient of a batch or a campaign costs only the render itself.
+    """
+
+    def __init__(self, folder: Path):
+        self.env = Environment(loader=FileSystemLoader(folder), auto_reload=False, cache_size=-1)
+        self._templates: dict[str, Template] = {}
+
+    def compile(self) -> list[str]:
+        """
+        The compile function loads and compiles every template of the folder.
+
+        Returns:
+            The names of the compiled templates
+        """
+        for name in self.env.list_templates():
+            self._templates[name] = self.env.get_template(name)
+        return list(self._templates)
+
+    def get(self, name: str) -> Template:
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = self.env.get_template(name)
+        return template
+
+    def render(self, name: str, context: dict) -> str:
+        """
+        The render function renders a compiled template and records the time in
+            email_template_render_seconds{template=name}.
+        """
+        template = self.get(name)
+        started = time.perf_counter()
+        html = template.render(context)
+        template_render_duration.observe(time.perf_counter() - started, template=name)
+        return html
+
+
+email_templates = EmailTemplates(conf.TEMPLATE_FOLDER)
+
+
+async def send_email(email: EmailStr, username: str, host: str, db: AsyncSession,
+                     commit: bool = True) -> EmailOutbox:
+    """
+    The send_email function queues the verification email of a user in the outbox; the email worker
+        sends it. The token is created when the email is sent, so it is valid for its full lifetime
+        even if the queue lags.
+
+    Args:
+        email: EmailStr: Address to verify
+        username: str: Name used in the greeting
+        host: str: Base url of the API, for the confirmation link
+        db: AsyncSession: Database session
+        commit: bool: Commit the outbox entry, instead of leaving that to the caller
+
+    Returns:
+        The outbox entry
+    """
+    return await repositories_outbox.enqueue_email(email, VERIFY_EMAIL_SUBJECT, VERIFY_EMAIL_TEMPLATE,
+                                                   {"host": host, "username": username}, db, commit=commit)
+
+
+def build_message(entry: EmailOutbox) -> EmailMessage:
+    """
+    The build_message function renders an outbox entry into an HTML email.
+    """
+    context = dict(entry.context)
+    if entry.template == VERIFY_EMAIL_TEMPLATE:
+        context["token"] = auth_service.create_email_token({"sub": entry.recipient})
+    message = EmailMessage()
+    message["From"] = formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM))
+    message["To"] = entry.recipient
+    message["Subject"] = entry.subject
+    message.set_content(email_templates.render(entry.template, context), subtype="html")
+    return message
+
+
+class SMTPMailer:
+    """
+    One SMTP session reused for every message, instead of a connection and TLS handshake per email.
+    The session is opened on the first message and reopened once if the server has dropped it.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str | None = None, password: str | None = None,
+                 use_tls: bool = False, start_tls: bool | None = None, validate_certs: bool = True,
+                 timeout: float = 30):
+        self._options = dict(hostname=hostname, port=port, username=username, password=password, use_tls=use_tls,
+                             start_tls=start_tls, validate_certs=validate_certs, timeout=timeout)
+        self._smtp: aiosmtplib.SMTP | None = None
+        self.connections = 0
+
+    @classmethod
+    def from_config(cls, connection: ConnectionConfig = conf) -> "SMTPMailer":
+        credentials = connection.USE_CREDENTIALS
+        return cls(connection.MAIL_SERVER, connection.MAIL_PORT,
+                   username=connection.MAIL_USERNAME if credentials else None,
+                   password=connection.MAIL_PASSWORD if credentials else None,
+                   use_tls=connection.MAIL_SSL_TLS, start_tls=connection.MAIL_STARTTLS or None,
+                   validate_certs=connection.VALIDATE_CERTS, timeout=connection.TIMEOUT)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = aiosmtplib.SMTP(**self._options)
+            await self._smtp.connect()
+            self.connections += 1
+        return self._smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        smtp = await self._connect()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            smtp = await self._connect()
+            await smtp.send_message(message)
+
+    async def close(self) -> None:
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                self._smtp.close()
+        self._smtp = None
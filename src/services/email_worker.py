@@ -0,0 +1,146 @@
+"""
+Drains the email outbox: python -m src.services.email_worker [--once]
+
+Emails are claimed in batches and sent over one reused SMTP session. A failed email is retried with
+exponential backoff (EMAIL_RETRY_SECONDS, doubled per attempt, capped at an hour) until
+EMAIL_MAX_ATTEMPTS, or given up at once if the server refused the recipient. Several workers may run
+side by side. The queue lag (age of the oldest pending email) is logged after every batch and served
+at /api/healthchecker/email by the API. Sent emails are deleted after EMAIL_RETENTION_DAYS, checked at
+most hourly while the queue is idle. Templates are compiled once at startup, so a batch from one
+template renders per recipient without parsing it again.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import aiosmtplib
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.conf.config import config
+from src.repository import outbox as repositories_outbox
+from src.services.email import SMTPMailer, build_message, email_templates
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_SECONDS = 3600
+PURGE_INTERVAL_SECONDS = 3600
+PERMANENT_ERRORS = (aiosmtplib.SMTPRecipientsRefused,)
+
+
+def retry_delay(attempts: int, base_seconds: float) -> float:
+    """
+    The retry_delay function returns the backoff before the next attempt, after attempts failed ones.
+    """
+    return min(base_seconds * 2 ** max(attempts - 1, 0), MAX_RETRY_SECONDS)
+
+
+class EmailWorker:
+
+    def __init__(self, session_maker: async_sessionmaker, mailer: SMTPMailer, batch_size: int = 50,
+                 max_attempts: int = 5, retry_seconds: float = 30, lease_seconds: int = 300,
+                 retention_days: float = 7):
+        self.session_maker = session_maker
+        self.mailer = mailer
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+        self.sent = 0
+        self.failed = 0
+        self._purged_at: float | None = None
+
+    async def run_once(self) -> int:
+        """
+        The run_once function sends one batch of due emails and records the outcome of each.
+
+        Returns:
+            The number of emails claimed; 0 means the queue had nothing due
+        """
+        async with self.session_maker() as db:
+            entries = await repositories_outbox.claim_batch(self.batch_size, self.lease_seconds, db)
+            sent = []
+            for entry in entries:
+                try:
+                    await self.mailer.send(build_message(entry))
+                except Exception as err:
+                    attempts = entry.attempts + 1
+                    retry_at = None
+                    if attempts < self.max_attempts and not isinstance(err, PERMANENT_ERRORS):
+                        retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts, self.retry_seconds))
+                    logger.warning("email %s to %s failed (attempt %d, %s): %s", entry.id, entry.recipient,
+                                   attempts, "retry at %s" % retry_at if retry_at else "giving up", err)
+                    await repositories_outbox.mark_failed(entry.id, f"{type(err).__name__}: {err}", retry_at, db)
+                    if retry_at is None:
+                        self.failed += 1
+                else:
+                    sent.append(entry.id)
+            await repositories_outbox.mark_sent(sent, db)
+            self.sent += len(sent)
+            if entries:
+                stats = await repositories_outbox.outbox_stats(db)
+                logger.info("sent %d of %d emails; %d pending, lag %.1f s", len(sent), len(entries),
+                            stats["pending"], stats["lag_seconds"])
+        return len(entries)
+
+    async def purge(self) -> int:
+        """
+        The purge function deletes the emails sent more than retention_days ago.
+
+        Returns:
+            The number of deleted emails
+        """
+        async with self.session_maker() as db:
+            purged = await repositories_outbox.purge_sent(datetime.utcnow() - timedelta(days=self.retention_days), db)
+        self._purged_at = time.monotonic()
+        if purged:
+            logger.info("purged %d sent emails older than %s days", purged, self.retention_days)
+        return purged
+
+    async def run(self, poll_seconds: float, stop: asyncio.Event | None = None) -> None:
+        """
+        The run function sends batches back to back while emails are due and polls every poll_seconds
+            when the queue is empty, until stop is set. The SMTP session is closed while idle.
+        """
+        stop = stop or asyncio.Event()
+        try:
+            while not stop.is_set():
+                if await self.run_once():
+                    continue
+                await self.mailer.close()
+                if self._purged_at is None or time.monotonic() - self._purged_at >= PURGE_INTERVAL_SECONDS:
+                    await self.purge()
+                try:
+                    await asyncio.wait_for(stop.wait(), poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.mailer.close()
+
+
+async def main(args) -> None:
+    from src.database.db import sessionmanager
+
+    logger.info("compiled email templates: %s", ", ".join(email_templates.compile()))
+    worker = EmailWorker(sessionmanager.session_maker, SMTPMailer.from_config(), config.EMAIL_BATCH_SIZE,
+                         config.EMAIL_MAX_ATTEMPTS, config.EMAIL_RETRY_SECONDS, config.EMAIL_LEASE_SECONDS,
+                         config.EMAIL_RETENTION_DAYS)
+    try:
+        if args.once:
+            while await worker.run_once():
+                pass
+            await worker.mailer.close()
+            await worker.purge()
+        else:
+            await worker.run(config.EMAIL_POLL_SECONDS)
+    finally:
+        await sessionmanager.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Drain the due emails and exit")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts) -> str:
+    """
+    The make_etag function builds a weak entity tag from the values that identify a representation.
+    """
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def contact_etag(contact_id: int, updated_at: datetime | None) -> str:
+    return make_etag("contact", contact_id, updated_at.isoformat() if updated_at else "")
+
+
+def list_validators(scope: str, query: str, rows) -> tuple[str, datetime | None]:
+    """
+    The list_validators function builds the ETag and Last-Modified of a page of contacts from the id and
+        updated_at of its rows, so a page changes its tag exactly when one of its contacts is modified,
+        removed or shifted in or out of it.
+    """
+    stamps = [(row.id, row.updated_at.isoformat() if row.updated_at else "") for row in rows]
+    last_modified = max((row.updated_at for row in rows if row.updated_at), default=None)
+    return make_etag("contacts", scope, query, stamps), last_modified
+
+
+def http_date(value: datetime) -> str:
+    """
+    The http_date function formats a timestamp for Last-Modified; naive database timestamps are taken as UTC.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def parse_http_date(value: str | None) -> datetime | None:
+    """
+    The parse_http_date function reads an HTTP date header, returning None if it is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """
+    The etag_matches function checks an If-None-Match / If-Match header against an entity tag.
+        Tags are compared weakly (the W/ prefix is ignored) for both headers, because all tags
+        produced here are weak.
+    """
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """
+    The is_not_modified function evaluates If-None-Match, or If-Modified-Since when there is no If-None-Match.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    since = parse_http_date(request.headers.get("if-modified-since"))
+    if since is not None and last_modified is not None:
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+def has_conditions(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def validator_headers(etag: str, last_modified: datetime | None) -> dict[str, str]:
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: datetime | None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified))
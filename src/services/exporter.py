@@ -0,0 +1,36 @@
+import csv
+import io
+from datetime import date
+from typing import Any, Iterable, Mapping
+
+from src.services.serialization import json_dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_ndjson(rows: Iterable[Mapping[str, Any]]) -> bytes:
+    """
+    The encode_ndjson function encodes rows as newline-delimited JSON, one object per line.
+    """
+    return b"".join(json_dumps(dict(row)) + b"\n" for row in rows)
+
+
+def encode_csv(rows: Iterable[Mapping[str, Any]], columns: list[str], header: bool = False) -> bytes:
+    """
+    The encode_csv function encodes rows as CSV lines, optionally preceded by the header line.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_default(value) if isinstance(value, date) else value for value in
+                         (row[column] for column in columns)])
+    return buffer.getvalue().encode()
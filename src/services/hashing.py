@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from passlib.context import CryptContext
+
+from src.conf.config import config
+
+# min/max rounds equal to the default make needs_update() flag every hash made with another cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=config.BCRYPT_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a thread or process pool so hashing never blocks the event loop.
+    At most `workers` hashes run at once; callers over the cap wait in a queue whose
+    depth is reported by stats().
+    """
+
+    def __init__(self, executor: str = "thread", workers: int = 4):
+        self.executor_kind = executor
+        self.workers = workers
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        The verify_and_update function checks a password against its hash.
+
+        Args:
+            password: str: Plain password
+            hashed_password: str: Stored hash
+
+        Returns:
+            (verified, new_hash), where new_hash is set when the stored hash was made
+            with another cost than BCRYPT_ROUNDS and should be replaced
+        """
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(config.PASSWORD_HASH_EXECUTOR, config.PASSWORD_HASH_WORKERS)
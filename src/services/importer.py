@@ -0,0 +1,116 @@
+import csv
+import json
+from typing import Any, AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.entity.models import User
+from src.repository import contacts as repositories_contacts
+from src.schemas.contact import ContactSchema, ContactImportReport, ContactImportError
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv",)
+
+Row = tuple[int, Any, str | None]
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    The iter_lines function splits a byte stream into text lines without buffering the whole body.
+    """
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """
+    The iter_ndjson function yields (line number, parsed object, error) for every non-empty line.
+    """
+    number = 0
+    async for line in iter_lines(stream):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as err:
+            yield number, None, f"invalid JSON: {err}"
+
+
+async def iter_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """
+    The iter_csv function yields (line number, row dict, error) for every record after the header line.
+        Quoted values may span lines; empty values are left out so schema defaults apply.
+    """
+    header = None
+    pending = ""
+    number = start = 0
+    async for line in iter_lines(stream):
+        number += 1
+        if not pending:
+            start = number
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record = next(csv.reader([pending]), [])
+        pending = ""
+        if not any(record):
+            continue
+        if header is None:
+            header = [name.strip() for name in record]
+            continue
+        if len(record) != len(header):
+            yield start, None, f"expected {len(header)} columns, got {len(record)}"
+            continue
+        yield start, {name: value for name, value in zip(header, record) if value != ""}, None
+    if pending:
+        yield start, None, "unterminated quoted value"
+
+
+async def import_contacts(rows: AsyncIterator[Row], db: AsyncSession, user: User, batch_size: int,
+                          max_errors: int) -> ContactImportReport:
+    """
+    The import_contacts function validates parsed rows against ContactSchema and inserts them in batches.
+        Only one batch is held in memory at a time. Invalid rows are counted and reported (up to
+        max_errors of them) without stopping the import.
+
+    Args:
+        rows: AsyncIterator[Row]: Output of iter_ndjson or iter_csv
+        db: AsyncSession: Pass the database session to the repository
+        user: User: Owner of the imported contacts
+        batch_size: int: Number of contacts per INSERT / COPY
+        max_errors: int: Maximum number of row errors included in the report
+
+    Returns:
+        A report with inserted and failed counts and per-row errors
+    """
+    report = ContactImportReport()
+    batch = []
+
+    def reject(number: int, errors: list[str]) -> None:
+        report.failed += 1
+        if len(report.errors) < max_errors:
+            report.errors.append(ContactImportError(row=number, errors=errors))
+
+    async for number, data, error in rows:
+        if error is not None:
+            reject(number, [error])
+            continue
+        try:
+            contact = ContactSchema.model_validate(data)
+        except ValidationError as err:
+            reject(number, [f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in err.errors()])
+            continue
+        batch.append(contact.model_dump())
+        if len(batch) >= batch_size:
+            report.inserted += await repositories_contacts.create_contacts(batch, db, user)
+            batch = []
+    report.inserted += await repositories_contacts.create_contacts(batch, db, user)
+    return report
@@ -0,0 +1,205 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+timings: ContextVar[dict[str, float] | None] = ContextVar("timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+class Metric:
+    """
+    Base of the metric types: a named family of samples, one per combination of label values.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram with fixed upper bounds; keeps per-bucket counts, the sum and the count.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class StatsCollector:
+    """
+    Exports a stats() dict of an existing component as gauges named <prefix>_<key>, read at scrape time.
+    """
+
+    def __init__(self, prefix: str, documentation: str, stats: Callable[[], dict]):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+
+    def render(self) -> str:
+        lines = []
+        for key, value in self.stats().items():
+            if value is None:
+                continue
+            name = f"{self.prefix}_{key}"
+            lines.append(f"# HELP {name} {_escape(self.documentation)} ({key})")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(float(value))}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """
+    The set of metrics exposed at /metrics, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._collectors: dict[str, Metric | StatsCollector] = {}
+
+    def register(self, collector: Metric | StatsCollector):
+        name = getattr(collector, "name", None) or collector.prefix
+        if name in self._collectors:
+            raise ValueError(f"Metric {name} is already registered")
+        self._collectors[name] = collector
+        return collector
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def stats(self, prefix: str, documentation: str, stats: Callable[[], dict]) -> StatsCollector:
+        return self.register(StatsCollector(prefix, documentation, stats))
+
+    def render(self) -> str:
+        parts = [collector.render() for collector in self._collectors.values()]
+        return "\n".join(part for part in parts if part) + "\n"
+
+
+registry = Registry()
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """
+    The record_timing function adds time to a Server-Timing phase of the current request, if one is tracked.
+    """
+    current = timings.get()
+    if current is not None:
+        current[name] = current.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timing(name: str):
+    """
+    The timing function measures the enclosed block as (part of) a Server-Timing phase.
+    """
+    if timings.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def server_timing_header(values: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in values.items())
+
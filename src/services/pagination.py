@@ -0,0 +1,45 @@
+import base64
+import json
+
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: int) -> str:
+    """
+    The encode_cursor function packs the sort key of the last row of a page into an opaque token.
+
+    Args:
+        *values: int: Sort key values of the last returned row, e.g. (user_id, id)
+
+    Returns:
+        A url-safe string that can be passed back as the cursor query parameter
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> tuple[int, ...]:
+    """
+    The decode_cursor function unpacks a token produced by encode_cursor.
+
+    Args:
+        cursor: str: The opaque token sent by the client
+        size: int: How many sort key values the cursor must contain
+
+    Returns:
+        A tuple with the sort key of the last row of the previous page
+
+    Raises:
+        HTTPException: 400 if the token is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(value, int) and not isinstance(value, bool) for value in values)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return tuple(values)
@@ -0,0 +1,304 @@
+"""
+Rate limits as route dependencies:
+
+    @router.get("/me", dependencies=[Depends(RateLimiter(times=10, seconds=60, name="users:me"))])
+
+Every policy (a name, a limit and a window) is counted per caller: per user for authenticated
+requests (the subject of the bearer token) and per client address otherwise, or always per address
+with per="ip". X-Forwarded-For is only read from peers in RATE_LIMIT_TRUSTED_PROXIES. Counting happens in Redis with an atomic sliding-window script, so the limit holds
+across workers. Policies of high-QPS routes can set local=True: each worker then decides from its own
+token bucket and pushes its consumption to the shared window in batches, trading a bounded overshoot
+(at most sync_batch requests per worker) for no Redis round trip on most requests. If Redis is
+unreachable, limits fall back to per-worker in-memory windows instead of failing the request.
+Decisions are counted in rate_limit_decisions_total{policy, decision, backend}.
+"""
+import logging
+import math
+import time
+from dataclasses import dataclass
+from ipaddress import ip_address, ip_network
+
+from fastapi import HTTPException, Request, Response, status
+from jose import JWTError
+from redis.exceptions import RedisError
+
+from src.conf.config import config
+from src.services.auth import auth_service
+from src.services.cache import redis_client
+from src.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PREFIX = "ratelimit"
+REDIS_RETRY_SECONDS = 5.0
+
+# Sliding window counter: the count of the current fixed window plus the count of the previous one
+# weighted by how much of it still overlaps the sliding window. Two integers per caller, whatever the
+# limit. KEYS[1] is the key prefix (with a hash tag, so both windows live in one cluster slot);
+# ARGV: window in ms, limit, cost, force (1 = always record the cost, used to sync local buckets).
+# Returns {allowed, estimated count, retry after in ms}; see retry_after for the wait.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = tonumber(ARGV[4])
+local current = math.floor(now / window)
+local current_key = KEYS[1] .. ':' .. current
+local elapsed = now % window
+local previous = tonumber(redis.call('GET', KEYS[1] .. ':' .. (current - 1)) or '0')
+local count = tonumber(redis.call('GET', current_key) or '0')
+local estimated = previous * (1 - elapsed / window) + count
+if force == 0 and estimated + cost > limit then
+    local free = limit - cost - count
+    local retry
+    if free >= 0 then
+        retry = math.ceil((1 - free / previous) * window) - elapsed
+    else
+        retry = window - elapsed + math.ceil(math.max(0, 1 - (limit - cost) / count) * window)
+    end
+    return {0, math.ceil(estimated), retry}
+end
+if cost > 0 then
+    redis.call('INCRBY', current_key, cost)
+    redis.call('PEXPIRE', current_key, window * 2)
+end
+return {1, math.ceil(estimated + cost), 0}
+"""
+
+decisions_total = registry.counter("rate_limit_decisions_total", "Rate limit decisions",
+                                   ("policy", "decision", "backend"))
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    remaining: int
+    retry_after: float
+    backend: str
+
+
+def retry_after(previous: float, count: float, elapsed: float, limit: int, cost: int, window: float) -> float:
+    """
+    The retry_after function returns how long a denied caller of a sliding window counter waits
+        until cost more requests fit: while the weight of the previous window decays if the current
+        window has room, otherwise into the next window, where the current count decays in turn.
+    """
+    free = limit - cost - count
+    if free >= 0:
+        return (1 - free / previous) * window - elapsed
+    return window - elapsed + max(0.0, 1 - (limit - cost) / count) * window
+
+
+class SlidingWindow:
+    """
+    The in-memory counterpart of SLIDING_WINDOW_SCRIPT, for one worker.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._windows: dict[str, tuple[int, int, int]] = {}
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1, now: float | None = None) -> Decision:
+        now = time.monotonic() if now is None else now
+        current = int(now // window)
+        if key not in self._windows and len(self._windows) >= self.max_keys:
+            self._windows.clear()
+        index, count, previous = self._windows.get(key, (current, 0, 0))
+        if index != current:
+            previous = count if index == current - 1 else 0
+            count = 0
+        elapsed = now % window
+        estimated = previous * (1 - elapsed / window) + count
+        if estimated + cost > limit:
+            self._windows[key] = (current, count, previous)
+            return Decision(False, 0, retry_after(previous, count, elapsed, limit, cost, window), "memory")
+        self._windows[key] = (current, count + cost, previous)
+        return Decision(True, max(0, int(limit - estimated - cost)), 0.0, "memory")
+
+    def clear(self) -> None:
+        self._windows.clear()
+
+
+class TokenBucket:
+    """
+    Per-worker bucket of one caller of a local policy; unsynced counts the requests it allowed since
+    its consumption was last pushed to Redis.
+    """
+    __slots__ = ("tokens", "updated", "unsynced", "synced")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.unsynced = 0
+        self.synced = now
+
+    def take(self, limit: int, window: float, now: float) -> bool:
+        self.tokens = min(limit, self.tokens + (now - self.updated) * limit / window)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.unsynced += 1
+        return True
+
+
+class RateLimitService:
+    """
+    Decides rate limits against Redis, local token buckets or, while Redis is down, in-memory windows.
+    Without a client (None) every limit is an in-memory window of this worker.
+    """
+
+    def __init__(self, client, prefix: str = RATE_LIMIT_PREFIX, retry_seconds: float = REDIS_RETRY_SECONDS,
+                 max_buckets: int = 10000):
+        self.client = client
+        self.prefix = prefix
+        self.retry_seconds = retry_seconds
+        self.max_buckets = max_buckets
+        self.memory = SlidingWindow()
+        self.buckets: dict[str, TokenBucket] = {}
+        self._script = client.register_script(SLIDING_WINDOW_SCRIPT) if client is not None else None
+        self._redis_down_until = 0.0
+
+    def _key(self, policy: str, identity: str) -> str:
+        return f"{self.prefix}:{{{policy}:{identity}}}"
+
+    async def _redis(self, key: str, limit: int, window: float, cost: int, force: bool) -> Decision | None:
+        if self._script is None or time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            allowed, estimated, retry_ms = await self._script(
+                keys=[key], args=[max(1, int(window * 1000)), limit, cost, int(force)]
+            )
+        except RedisError as err:
+            if not self._redis_down_until:
+                logger.warning("rate limiter falls back to in-memory limits: %s", err)
+            self._redis_down_until = time.monotonic() + self.retry_seconds
+            return None
+        if self._redis_down_until:
+            logger.info("rate limiter uses Redis again")
+            self._redis_down_until = 0.0
+            self.memory.clear()
+        return Decision(bool(allowed), max(0, limit - int(estimated)), int(retry_ms) / 1000, "redis")
+
+    async def _local(self, key: str, limit: int, window: float, sync_batch: int, sync_seconds: float) -> Decision:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self.buckets.clear()
+            bucket = self.buckets[key] = TokenBucket(limit, now)
+        allowed = bucket.take(limit, window, now)
+        if bucket.unsynced >= sync_batch or (bucket.unsynced and now - bucket.synced >= sync_seconds):
+            cost, bucket.unsynced, bucket.synced = bucket.unsynced, 0, now
+            shared = await self._redis(key, limit, window, cost, force=True)
+            if shared is None:
+                bucket.unsynced += cost
+            else:
+                # other workers used part of the shared window: never hand out more than is left of it
+                bucket.tokens = min(bucket.tokens, shared.remaining)
+        if allowed:
+            return Decision(True, int(bucket.tokens), 0.0, "local")
+        return Decision(False, 0, (1 - bucket.tokens) * window / limit, "local")
+
+    async def hit(self, policy: str, identity: str, limit: int, window: float, local: bool = False,
+                  sync_batch: int = 10, sync_seconds: float = 1.0) -> Decision:
+        """
+        The hit function counts one request of identity against a policy.
+
+        Args:
+            policy: str: Name of the policy, e.g. "users:me"
+            identity: str: The caller, e.g. "user:<email>" or "ip:<address>"
+            limit: int: Requests allowed per window
+            window: float: Window length in seconds
+            local: bool: Decide from a per-worker token bucket, synced to Redis in batches
+            sync_batch: int: Local decisions after which the bucket is synced
+            sync_seconds: float: Longest time a bucket with unsynced decisions waits for its sync
+
+        Returns:
+            The decision, with the remaining requests and, when denied, the seconds to wait
+        """
+        key = self._key(policy, identity)
+        if local:
+            decision = await self._local(key, limit, window, sync_batch, sync_seconds)
+        else:
+            decision = await self._redis(key, limit, window, 1, force=False)
+            if decision is None:
+                decision = self.memory.hit(key, limit, window)
+        decisions_total.inc(policy=policy, decision="allowed" if decision.allowed else "denied",
+                            backend=decision.backend)
+        return decision
+
+
+rate_limit_service = RateLimitService(redis_client)
+trusted_proxies = [ip_network(network.strip(), strict=False) for network in config.RATE_LIMIT_TRUSTED_PROXIES]
+
+
+def is_trusted_proxy(host: str | None) -> bool:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def client_identity(request: Request) -> str:
+    """
+    The client_identity function identifies the caller by address. The peer address is used unless the
+        peer is a trusted proxy; then X-Forwarded-For is read from the right, skipping trusted proxies,
+        because every entry left of the last untrusted hop could have been sent by the client itself.
+    """
+    host = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and is_trusted_proxy(host):
+        for hop in reversed(forwarded.split(",")):
+            host = hop.strip()
+            if not is_trusted_proxy(host):
+                break
+    return f"ip:{host or 'unknown'}"
+
+
+def user_identity(request: Request) -> str:
+    """
+    The user_identity function identifies the caller by the subject of its bearer token (verified
+        through the token cache of auth_service), or by address if there is no valid token.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = auth_service.decode_access_token(token).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    return client_identity(request)
+
+
+class RateLimiter:
+    """
+    Route dependency enforcing one policy; answers 429 with Retry-After when the limit is reached.
+    """
+
+    def __init__(self, times: int, seconds: float, name: str | None = None, per: str = "user",
+                 local: bool = False, sync_batch: int = 10, service: RateLimitService | None = None):
+        if per not in ("user", "ip"):
+            raise ValueError("per must be user or ip")
+        self.times = times
+        self.seconds = seconds
+        self.name = name
+        self.identity = user_identity if per == "user" else client_identity
+        self.local = local
+        self.sync_batch = sync_batch
+        self.service = service
+
+    async def __call__(self, request: Request, response: Response):
+        service = self.service or rate_limit_service
+        decision = await service.hit(self.name or request.url.path, self.identity(request), self.times,
+                                     self.seconds, local=self.local, sync_batch=self.sync_batch)
+        headers = {"X-RateLimit-Limit": str(self.times), "X-RateLimit-Remaining": str(decision.remaining)}
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers=headers)
+        response.headers.update(headers)
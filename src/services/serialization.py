@@ -0,0 +1,91 @@
+import enum
+import json
+from datetime import date
+from typing import Any, Sequence
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import Row
+
+from src.schemas.contact import ContactResponse
+from src.schemas.user import UserResponse
+from src.services.metrics import timing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - declared dependency; the standard library is the fallback
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+CONTACT_KEYS = tuple(ContactResponse.model_fields)
+USER_KEYS = tuple(UserResponse.model_fields)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_dumps(content: Any) -> bytes:
+    """
+    The json_dumps function encodes content as compact UTF-8 JSON, with orjson when it is installed
+        and the standard library otherwise. Dates, datetimes and enums are supported by both.
+
+    Args:
+        content: Any: Data to encode
+
+    Returns:
+        The JSON document as bytes
+    """
+    with timing("serialization"):
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by json_dumps; unlike fastapi.responses.ORJSONResponse it works without orjson.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+def contact_to_dict(contact: Any, keys: Sequence[str] = CONTACT_KEYS) -> dict:
+    """
+    The contact_to_dict function reads the given ContactResponse fields of a contact (ORM object or
+        column-only row) into a dict, with the owner converted to the fields of UserResponse.
+    """
+    data = {key: getattr(contact, key) for key in keys}
+    user = data.get("user")
+    if user is not None:
+        data["user"] = {key: getattr(user, key) for key in USER_KEYS}
+    return data
+
+
+def encode_contacts(contacts: Sequence[Any]) -> bytes:
+    """
+    The encode_contacts function encodes a page of contacts straight from the database rows,
+        skipping the from_attributes validation and the intermediate dicts of response_model.
+        Column-only rows keep only their selected fields (like ContactFieldsResponse with
+        exclude_unset); ORM contacts produce every field of ContactResponse.
+
+    Args:
+        contacts: Sequence[Any]: Rows from the contacts repository
+
+    Returns:
+        The JSON array as bytes
+    """
+    if not contacts:
+        return b"[]"
+    first = contacts[0]
+    keys = CONTACT_KEYS
+    if isinstance(first, Row):
+        present = set(first._fields)
+        keys = tuple(key for key in CONTACT_KEYS if key in present)
+    with timing("serialization"):
+        items = [contact_to_dict(contact, keys) for contact in contacts]
+    return json_dumps(items)
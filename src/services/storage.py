@@ -0,0 +1,147 @@
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - boto3 is optional, needed only for the S3 backend
+    boto3 = None
+
+from src.conf.config import Settings
+
+
+class Storage(ABC):
+    """
+    Where avatars are kept. Keys are relative paths like "avatars/1/<digest>.webp"; every call that
+    talks to a remote service or the disk runs in a thread, so the event loop is never blocked.
+    """
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        """
+        The save function stores data under key, replacing an existing object, and returns its public url.
+        """
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+
+class LocalStorage(Storage):
+    """
+    Files under a local directory served by the app, e.g. src/static/avatars at /static/avatars.
+    Works offline; meant for development and single-host deployments.
+    """
+
+    def __init__(self, root: Path | str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage key {key!r}")
+        return path
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).is_file)
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        path = self._path(key)
+
+        def write():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_name(path.name + ".part")
+            temporary.write_bytes(data)
+            temporary.replace(path)
+
+        await asyncio.to_thread(write)
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class CloudinaryStorage(Storage):
+    """
+    Cloudinary images; the key without its extension is the public id (inside folder).
+    exists always answers False: a lookup would cost an Admin API call, which is rate limited per hour,
+    while the pipeline already skips uploads of the user's current avatar and overwrite=True makes
+    uploading an existing image again harmless.
+    """
+
+    def __init__(self, folder: str = "Web19"):
+        self.folder = folder
+
+    def _public_id(self, key: str) -> str:
+        return f"{self.folder}/{key.rsplit('.', 1)[0]}"
+
+    async def exists(self, key: str) -> bool:
+        return False
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        result = await asyncio.to_thread(cloudinary.uploader.upload, data, public_id=self._public_id(key),
+                                         overwrite=True, resource_type="image")
+        return self.url(key, result.get("version"))
+
+    def url(self, key: str, version: str | None = None) -> str:
+        return cloudinary.CloudinaryImage(self._public_id(key)).build_url(
+            width=250, height=250, crop="fill", format="webp", version=version
+        )
+
+
+class S3Storage(Storage):
+    """
+    Objects in an S3-compatible bucket (AWS, MinIO, R2, ...), served from public_url. Needs boto3.
+    Keys contain the content hash, so objects are immutable and cached for a year.
+    """
+
+    def __init__(self, bucket: str, public_url: str, endpoint_url: str | None = None, region: str | None = None):
+        if boto3 is None:
+            raise RuntimeError("The S3 avatar storage requires boto3 (poetry install -E s3)")
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+        except ClientError as err:
+            if err.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=key, Body=data,
+                                ContentType=content_type, CacheControl="public, max-age=31536000, immutable")
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+
+def create_storage(settings: Settings) -> Storage:
+    """
+    The create_storage function builds the avatar storage selected by AVATAR_STORAGE.
+    """
+    if settings.AVATAR_STORAGE == "local":
+        return LocalStorage(settings.AVATAR_LOCAL_DIR, settings.AVATAR_LOCAL_URL)
+    if settings.AVATAR_STORAGE == "s3":
+        return S3Storage(settings.AVATAR_S3_BUCKET, settings.AVATAR_S3_PUBLIC_URL, settings.AVATAR_S3_ENDPOINT_URL,
+                         settings.AVATAR_S3_REGION)
+    cloudinary.config(
+        cloud_name=settings.CLD_NAME,
+        api_key=settings.CLD_API_KEY,
+        api_secret=settings.CLD_API_SECRET,
+        secure=True,
+    )
+    return CloudinaryStorage()
@@ -1,4 +1,5 @@
 import asyncio
+from functools import partial
 
 import pytest
 import pytest_asyncio
@@ -8,7 +9,9 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 
 from main import app
 from src.entity.models import Base, User
-from src.database.db import get_db
+from src.conf.config import config
+from src.database.db import get_db, get_session_maker
+from src.database import instrumentation
 from src.services.auth import auth_service
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
@@ -17,6 +20,8 @@ engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
 
+instrumentation.instrument_engine(engine.sync_engine, config.SLOW_QUERY_SECONDS, config.QUERY_REPEAT_THRESHOLD)
+
 TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 test_user = {"username": "deadpool", "email": "deadpool@example.com", "password": "12345678"}
@@ -29,7 +34,7 @@ def init_models_wrap():
             await conn.run_sync(Base.metadata.drop_all)
             await conn.run_sync(Base.metadata.create_all)
         async with TestingSessionLocal() as session:
-            hash_password = auth_service.get_password_hash(test_user["password"])
+            hash_password = await auth_service.get_password_hash(test_user["password"])
             current_user = User(username=test_user["username"], email=test_user["email"], password=hash_password,
                                 confirmed=True, role="admin")
             session.add(current_user)
@@ -49,10 +54,12 @@ def client():
         except Exception as err:
             print(err)
             await session.rollback()
+            raise
         finally:
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_maker] = lambda: TestingSessionLocal
 
     yield TestClient(app)
 
@@ -61,3 +68,8 @@ def client():
 async def get_token():
     token = await auth_service.create_access_token(data={"sub": test_user["email"]})
     return token
+
+
+@pytest.fixture()
+def query_budget():
+    return partial(instrumentation.query_budget, engine.sync_engine)
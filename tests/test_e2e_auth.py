@@ -1,18 +1,17 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, AsyncMock
 
 import pytest
 from sqlalchemy import select
 
-from src.entity.models import User
+from src.entity.models import User, EmailOutbox
 from tests.conftest import TestingSessionLocal
 from src.conf import messages
 
 user_data = {"username": "agent007", "email": "agent007@gmail.com", "password": "12345678"}
 
 
-def test_signup(client, monkeypatch):
-    mock_send_email = Mock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+@pytest.mark.asyncio
+async def test_signup(client):
     response = client.post("api/auth/signup", json=user_data)
     assert response.status_code == 201, response.text
     data = response.json()
@@ -20,6 +19,22 @@ def test_signup(client, monkeypatch):
     assert data["email"] == user_data["email"]
     assert "password" not in data
     assert "avatar" in data
+    async with TestingSessionLocal() as session:
+        email = await session.execute(select(EmailOutbox).where(EmailOutbox.recipient == user_data["email"]))
+        email = email.scalar_one()
+    assert email.template == "verify_email.html"
+    assert email.context["username"] == user_data["username"]
+
+
+@pytest.mark.asyncio
+async def test_signup_rolls_back_user_without_email(client, monkeypatch):
+    monkeypatch.setattr("src.services.email.repositories_outbox.enqueue_email",
+                        AsyncMock(side_effect=RuntimeError("outbox unavailable")))
+    with pytest.raises(RuntimeError):
+        client.post("api/auth/signup", json={**user_data, "username": "agent008", "email": "agent008@gmail.com"})
+    async with TestingSessionLocal() as session:
+        user = await session.execute(select(User).where(User.email == "agent008@gmail.com"))
+        assert user.scalar_one_or_none() is None
 
 
 # def test_repeat_signup(client, monkeypatch):
@@ -1,12 +1,23 @@
-from unittest.mock import Mock, patch
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from unittest.mock import Mock, patch, AsyncMock
 
 import pytest
+from redis.exceptions import RedisError
 
+from src.entity.models import User, Role, Contact
+from src.repository.contacts import get_upcoming_birthdays
+from src.repository.users import update_avatar_url
 from src.services.auth import auth_service
+from src.services.cache import dump_principal, load_principal, contact_list_cache, principal_cache
+from tests.conftest import TestingSessionLocal
 
 
 def test_get_contacts(client, get_token):
-    with patch.object(auth_service, 'cache') as redis_mock:
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         token = get_token
         headers = {"Authorization": f"Bearer {token}"}
@@ -17,7 +28,7 @@ def test_get_contacts(client, get_token):
 
 
 def test_create_contact(client, get_token, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         token = get_token
         headers = {"Authorization": f"Bearer {token}"}
@@ -26,7 +37,7 @@ def test_create_contact(client, get_token, monkeypatch):
             "last_name": "test",
             "email": "test@test.com",
             "phone_number": "test",
-            "birthday": "test",
+            "birthday": "2000-01-01",
             "extra_info": "test",
             # "completed": "test",
         })
@@ -37,7 +48,422 @@ def test_create_contact(client, get_token, monkeypatch):
         assert data["last_name"] == "test"
         assert data["email"] == "test@test.com"
         assert data["phone_number"] == "test"
-        assert data["birthday"] == "test"
+        assert data["birthday"] == "2000-01-01"
         assert data["extra_info"] == "test"
         # assert data["completed"] == "test"
 
+
+def test_get_contacts_cursor(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        for i in range(10):
+            response = client.post("api/contacts", headers=headers, json={
+                "first_name": f"cursor{i}",
+                "last_name": "test",
+                "email": f"cursor{i}@test.com",
+                "phone_number": "test",
+                "birthday": "2000-01-01",
+                "extra_info": "test",
+            })
+            assert response.status_code == 201, response.text
+
+        response = client.get("api/contacts", headers=headers, params={"limit": 10})
+        assert response.status_code == 200, response.text
+        first_page = response.json()
+        assert len(first_page) == 10
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = client.get("api/contacts", headers=headers, params={"limit": 10, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        second_page = response.json()
+        assert len(second_page) == 1
+        assert second_page[0]["id"] > first_page[-1]["id"]
+        assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_contacts_invalid_cursor(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.get("api/contacts", headers=headers, params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400, response.text
+
+
+def test_create_contact_cached_user(client, get_token):
+    user = User(id=1, username="deadpool", email="deadpool@example.com", role=Role.admin, confirmed=True)
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = load_principal(dump_principal(user))
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "cached",
+            "last_name": "test",
+            "email": "cached@test.com",
+            "phone_number": "test",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        assert response.status_code == 201, response.text
+        assert response.json()["user"]["email"] == "deadpool@example.com"
+        redis_mock.set.assert_not_called()
+
+
+def test_import_contacts_ndjson(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}", "Content-Type": "application/x-ndjson"}
+        rows = [json.dumps({"first_name": f"bulk{i}", "last_name": "test", "email": f"bulk{i}@test.com",
+                            "phone_number": "test", "birthday": "2000-01-01", "extra_info": "test"}) for i in range(5)]
+        rows.insert(2, json.dumps({"first_name": "x"}))
+        rows.insert(4, "{not json")
+        response = client.post("api/contacts/bulk", headers=headers, params={"batch_size": 2},
+                               content="\n".join(rows))
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 5
+        assert data["failed"] == 2
+        assert [error["row"] for error in data["errors"]] == [3, 5]
+
+
+def test_import_contacts_csv(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}", "Content-Type": "text/csv"}
+        body = ("first_name,last_name,email,phone_number,birthday,extra_info\r\n"
+                'csvone,test,csv1@test.com,123,2000-01-01,"multi\nline"\r\n'
+                "csvtwo,test,not-an-email,123,2000-01-01,test\r\n")
+        response = client.post("api/contacts/bulk", headers=headers, content=body)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert data["failed"] == 1
+        assert data["errors"][0]["row"] == 4
+        assert data["errors"][0]["errors"][0].startswith("email")
+
+
+def test_import_contacts_unsupported_type(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}", "Content-Type": "application/xml"}
+        response = client.post("api/contacts/bulk", headers=headers, content="<contacts/>")
+        assert response.status_code == 415, response.text
+
+
+def test_export_contacts(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.get("api/contacts/export", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows
+        assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+        assert "user" not in rows[0]
+
+        response = client.get("api/contacts/export", headers=headers, params={"format": "csv"})
+        assert response.status_code == 200, response.text
+        records = list(csv.DictReader(io.StringIO(response.text)))
+        assert [int(record["id"]) for record in records] == [row["id"] for row in rows]
+
+
+def test_search_contacts(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "Jonathan",
+            "last_name": "Harker",
+            "email": "jharker@castle.com",
+            "phone_number": "5550001",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+
+        for q in ("jona", "harker jon", "castle", "5550"):
+            response = client.get("api/contacts/search", headers=headers, params={"q": q})
+            assert response.status_code == 200, response.text
+            assert [contact["id"] for contact in response.json()] == [contact_id], q
+
+        response = client.get("api/contacts/search", headers=headers, params={"q": "harker dracula"})
+        assert response.status_code == 200, response.text
+        assert response.json() == []
+
+
+def test_get_upcoming_birthdays(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        today = date.today()
+        expected = []
+        for offset in (0, 3, 40):
+            day = today + timedelta(days=offset)
+            birthday = day.replace(year=1990) if not (day.month == 2 and day.day == 29) else date(1992, 2, 29)
+            response = client.post("api/contacts", headers=headers, json={
+                "first_name": f"birthday{offset}",
+                "last_name": "test",
+                "email": f"birthday{offset}@test.com",
+                "phone_number": "test",
+                "birthday": birthday.isoformat(),
+                "extra_info": "test",
+            })
+            assert response.status_code == 201, response.text
+            expected.append(response.json()["id"])
+
+        response = client.get("api/contacts/birthdays", headers=headers, params={"days": 7})
+        assert response.status_code == 200, response.text
+        ids = [contact["id"] for contact in response.json()]
+        assert [contact_id for contact_id in ids if contact_id in expected] == expected[:2]
+
+
+@pytest.mark.asyncio
+async def test_get_upcoming_birthdays_year_wrap():
+    async with TestingSessionLocal() as session:
+        user = User(username="wrap", email="wrap@example.com", password="hash")
+        session.add(user)
+        for birthday in (date(1990, 1, 2), date(1985, 12, 30), date(1990, 12, 20), date(1990, 1, 20)):
+            session.add(Contact(first_name="wrap", last_name="test", email="wrap@test.com", phone_number="test",
+                                birthday=birthday, extra_info="test", user=user))
+        session.add(Contact(first_name="wrap", last_name="test", email="wrap@test.com", phone_number="test",
+                            birthday=None, extra_info="test", user=user))
+        await session.commit()
+
+        contacts = await get_upcoming_birthdays(7, session, user, today=date(2025, 12, 29))
+        assert [contact.birthday for contact in contacts] == [date(1985, 12, 30), date(1990, 1, 2)]
+        contacts = await get_upcoming_birthdays(366, session, user, today=date(2025, 12, 29))
+        assert len(contacts) == 4
+
+
+def test_patch_and_delete_contact(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "patch",
+            "last_name": "test",
+            "email": "patch@test.com",
+            "phone_number": "test",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+
+        response = client.patch(f"api/contacts/{contact_id}", headers=headers,
+                                json={"last_name": "patched", "first_name": None, "birthday": None})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["first_name"] == "patch"
+        assert data["last_name"] == "patched"
+        assert data["birthday"] is None
+        assert data["user"]["email"] == "deadpool@example.com"
+
+        response = client.put(f"api/contacts/{contact_id}", headers=headers,
+                              json={"email": "put@test.com", "completed": True})
+        assert response.status_code == 200, response.text
+        assert response.json()["email"] == "put@test.com"
+        assert response.json()["completed"] is True
+        assert response.json()["last_name"] == "patched"
+
+        response = client.delete(f"api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 204, response.text
+        response = client.patch(f"api/contacts/{contact_id}", headers=headers, json={"last_name": "gone"})
+        assert response.status_code == 404, response.text
+
+
+def test_get_contacts_fields(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.get("api/contacts", headers=headers)
+        assert response.status_code == 200, response.text
+        assert "user" not in response.json()[0]
+        assert "extra_info" in response.json()[0]
+
+        response = client.get("api/contacts", headers=headers, params={"fields": "first_name,email"})
+        assert response.status_code == 200, response.text
+        assert set(response.json()[0]) == {"id", "first_name", "email"}
+
+        response = client.get("api/contacts", headers=headers, params={"fields": "email", "include": "user"})
+        assert response.status_code == 200, response.text
+        assert set(response.json()[0]) == {"id", "email", "user"}
+        assert response.json()[0]["user"]["email"] == "deadpool@example.com"
+
+        response = client.get("api/contacts", headers=headers, params={"fields": "password"})
+        assert response.status_code == 400, response.text
+
+
+def test_conditional_requests(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "etag",
+            "last_name": "test",
+            "email": "etag@test.com",
+            "phone_number": "test",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+
+        response = client.get(f"api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+        assert "last-modified" in response.headers
+
+        response = client.get(f"api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304, response.text
+        assert response.headers["etag"] == etag
+        response = client.get(f"api/contacts/{contact_id}", headers={**headers, "If-None-Match": 'W/"stale"'})
+        assert response.status_code == 200, response.text
+
+        response = client.get("api/contacts", headers=headers)
+        list_etag = response.headers["etag"]
+        response = client.get("api/contacts", headers={**headers, "If-None-Match": list_etag})
+        assert response.status_code == 304, response.text
+        response = client.get("api/contacts", headers={**headers, "If-None-Match": list_etag},
+                              params={"fields": "email"})
+        assert response.status_code == 200, response.text
+
+        response = client.patch(f"api/contacts/{contact_id}", headers={**headers, "If-Match": 'W/"stale"'},
+                                json={"last_name": "lost"})
+        assert response.status_code == 412, response.text
+        response = client.patch(f"api/contacts/{contact_id}", headers={**headers, "If-Match": etag},
+                                json={"last_name": "won"})
+        assert response.status_code == 200, response.text
+        assert response.json()["last_name"] == "won"
+        assert response.headers["etag"] != etag
+        # the write changed the tag even within the same second, so the old tag is stale
+        response = client.patch(f"api/contacts/{contact_id}", headers={**headers, "If-Match": etag},
+                                json={"last_name": "lost again"})
+        assert response.status_code == 412, response.text
+        response = client.get(f"api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.json()["last_name"] == "won"
+
+        response = client.delete(f"api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 204, response.text
+        response = client.get(f"api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 404, response.text
+
+
+class FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+
+
+def test_get_contacts_response_cache(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock, \
+            patch.object(contact_list_cache, 'client', FakeRedis()), \
+            patch.object(contact_list_cache, 'enabled', True):
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        first = client.get("api/contacts", headers=headers, params={"fields": "email", "limit": 500})
+        assert first.status_code == 200, first.text
+        hits = contact_list_cache.hits
+        with patch("src.repository.contacts.get_contacts", new_callable=AsyncMock) as get_contacts_mock:
+            second = client.get("api/contacts", headers=headers, params={"fields": "email", "limit": 500})
+            get_contacts_mock.assert_not_called()
+        assert contact_list_cache.hits == hits + 1
+        assert second.json() == first.json()
+        assert second.headers["etag"] == first.headers["etag"]
+        response = client.get("api/contacts", headers={**headers, "If-None-Match": first.headers["etag"]},
+                              params={"fields": "email", "limit": 500})
+        assert response.status_code == 304, response.text
+
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "cached",
+            "last_name": "test",
+            "email": "cached@test.com",
+            "phone_number": "test",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        assert response.status_code == 201, response.text
+        third = client.get("api/contacts", headers=headers, params={"fields": "email", "limit": 500})
+        assert third.headers["etag"] != first.headers["etag"]
+        assert {"id": response.json()["id"], "email": "cached@test.com"} in third.json()
+
+
+@pytest.mark.asyncio
+async def test_include_user_pages_follow_owner_avatar(client, get_token):
+    # the avatar is updated from the test's event loop, so keep it off the app's Redis connections
+    principal_redis = Mock(get=AsyncMock(side_effect=RedisError), set=AsyncMock(side_effect=RedisError),
+                           pipeline=Mock(side_effect=RedisError))
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock, \
+            patch.object(principal_cache, 'client', principal_redis), \
+            patch.object(contact_list_cache, 'client', FakeRedis()), \
+            patch.object(contact_list_cache, 'enabled', True):
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        params = {"include": "user", "fields": "email", "limit": 500}
+        first = client.get("api/contacts", headers=headers, params=params)
+        assert first.status_code == 200, first.text
+        async with TestingSessionLocal() as session:
+            await update_avatar_url("deadpool@example.com", "https://avatars.test/new.webp", session)
+        try:
+            second = client.get("api/contacts", headers=headers, params=params)
+            assert second.status_code == 200, second.text
+            assert second.headers["etag"] != first.headers["etag"]
+            assert all(row["user"]["avatar"] == "https://avatars.test/new.webp" for row in second.json())
+            response = client.get("api/contacts", headers={**headers, "If-None-Match": first.headers["etag"]},
+                                  params=params)
+            assert response.status_code == 200, response.text
+        finally:
+            async with TestingSessionLocal() as session:
+                await update_avatar_url("deadpool@example.com", None, session)
+
+
+def test_metrics(client, get_token):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        client.get("api/contacts/1", headers={"Authorization": f"Bearer {get_token}"})
+    response = client.get("metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/api/contacts/{contact_id}",status="2xx"}' in response.text
+    assert "token_cache_hits" in response.text
+    assert "password_hasher_workers" in response.text
+
+
+def test_query_budgets(client, get_token, query_budget):
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {get_token}"}
+        response = client.post("api/contacts", headers=headers, json={
+            "first_name": "budget",
+            "last_name": "test",
+            "email": "budget@test.com",
+            "phone_number": "test",
+            "birthday": "2000-01-01",
+            "extra_info": "test",
+        })
+        contact_id = response.json()["id"]
+        # one statement loads the user (principal cache miss), the rest is the route itself
+        with query_budget(2):
+            assert client.get(f"api/contacts/{contact_id}", headers=headers).status_code == 200
+        with query_budget(2):
+            response = client.get("api/contacts", headers=headers)
+            assert response.status_code == 200
+        with query_budget(2):
+            assert client.get("api/contacts", headers={**headers, "If-None-Match": response.headers["etag"]}
+                              ).status_code == 304
+        with query_budget(2):
+            assert client.patch(f"api/contacts/{contact_id}", headers=headers,
+                                json={"last_name": "budgeted"}).status_code == 200
+        with query_budget(2):
+            assert client.delete(f"api/contacts/{contact_id}", headers=headers).status_code == 204
@@ -3,18 +3,23 @@ from unittest.mock import Mock, patch, AsyncMock
 import pytest
 
 from src.services.auth import auth_service
+from src.services.rate_limit import RateLimitService, decisions_total
 
 
 def test_get_me(client, get_token, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
+    # in-memory limits, so the outcome does not depend on whether a Redis server is reachable
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as redis_mock, \
+            patch("src.services.rate_limit.rate_limit_service", RateLimitService(None)):
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         token = get_token
         headers = {"Authorization": f"Bearer {token}"}
         response = client.get("api/users/me", headers=headers)
         assert response.status_code == 200, response.text
+        assert response.headers["X-RateLimit-Limit"] == "1"
+        response = client.get("api/users/me", headers=headers)
+        assert response.status_code == 429, response.text
+        assert 20 <= int(response.headers["Retry-After"]) <= 40
+    assert decisions_total.value(policy="users:me", decision="denied", backend="memory") == 1
 
 
 
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+from src.services.auth import Auth
+from src.services.cache import LRUCache
+from src.services.hashing import PasswordHasher
+
+
+class TestDecodeAccessToken(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.auth = Auth()
+        self.auth.token_cache = LRUCache(maxsize=10, ttl=900)
+
+    async def test_claims_are_cached(self):
+        token = await self.auth.create_access_token(data={"sub": "test@example.com"})
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode_mock:
+            first = self.auth.decode_access_token(token)
+            second = self.auth.decode_access_token(token)
+        self.assertEqual(first["sub"], "test@example.com")
+        self.assertEqual(first, second)
+        decode_mock.assert_called_once()
+        self.assertEqual((self.auth.token_cache.hits, self.auth.token_cache.misses), (1, 1))
+
+    async def test_expired_token_is_not_cached(self):
+        token = await self.auth.create_access_token(data={"sub": "test@example.com"}, expires_delta=-1)
+        with self.assertRaises(JWTError):
+            self.auth.decode_access_token(token)
+        self.assertEqual(len(self.auth.token_cache), 0)
+
+    def test_invalid_token(self):
+        with self.assertRaises(JWTError):
+            self.auth.decode_access_token("not-a-token")
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.hasher = PasswordHasher("thread", workers=2)
+
+    def tearDown(self) -> None:
+        self.hasher.shutdown()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("12345678")
+        self.assertEqual(await self.hasher.verify_and_update("12345678", hashed), (True, None))
+        self.assertEqual(await self.hasher.verify_and_update("wrong", hashed), (False, None))
+        self.assertEqual(self.hasher.stats(), {"workers": 2, "waiting": 0, "in_flight": 0, "completed": 3})
+
+    async def test_rehash_on_cost_change(self):
+        hashed = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("12345678")
+        verified, new_hash = await self.hasher.verify_and_update("12345678", hashed)
+        self.assertTrue(verified)
+        self.assertIsNotNone(new_hash)
+        self.assertEqual(await self.hasher.verify_and_update("12345678", new_hash), (True, None))
@@ -0,0 +1,98 @@
+import hashlib
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+from fastapi import UploadFile
+
+from src.services.avatars import AvatarPipeline, AvatarTooLarge, spool_upload, render_avatar, InvalidAvatar, \
+    AvatarProcessingUnavailable
+from src.services.storage import LocalStorage, Storage, CloudinaryStorage
+
+
+def upload(data: bytes, content_type: str = "image/png") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="avatar.png", headers={"content-type": content_type})
+
+
+class CountingStorage(LocalStorage):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.saved = 0
+
+    async def save(self, key, data, content_type):
+        self.saved += 1
+        return await super().save(key, data, content_type)
+
+
+class TestAvatarPipeline(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.storage = CountingStorage(self.root, "/static/avatars")
+
+    async def test_spool_upload(self):
+        data = b"x" * 200_000
+        spool, digest = await spool_upload(upload(data), max_bytes=300_000)
+        with spool:
+            self.assertEqual(spool.read(), data)
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        with self.assertRaises(AvatarTooLarge):
+            await spool_upload(upload(data), max_bytes=100_000)
+
+    async def test_content_hash_skips_upload(self):
+        pipeline = AvatarPipeline(self.storage, max_bytes=1024)
+        renders = []
+
+        def fake_render(source, size):
+            renders.append(size)
+            return source.read(), "image/webp"
+
+        with patch("src.services.avatars.render_avatar", fake_render):
+            url = await pipeline.store(upload(b"image"), user_id=1)
+            self.assertTrue(url.startswith("/static/avatars/avatars/1/"))
+            self.assertEqual(await pipeline.store(upload(b"image"), user_id=1, current_url=url), url)
+            self.assertEqual(await pipeline.store(upload(b"image"), user_id=1), url)
+            other = await pipeline.store(upload(b"other image"), user_id=1, current_url=url)
+        self.assertNotEqual(other, url)
+        self.assertEqual(self.storage.saved, 2)
+        self.assertEqual(renders, [250, 250])
+
+    async def test_rejects_uploads_without_pillow(self):
+        pipeline = AvatarPipeline(self.storage, max_bytes=1024)
+        with patch("src.services.avatars.Image", None):
+            with self.assertRaises(AvatarProcessingUnavailable):
+                await pipeline.store(upload(b"image"), user_id=1)
+        self.assertEqual(self.storage.saved, 0)
+
+    async def test_local_storage_rejects_escaping_keys(self):
+        with self.assertRaises(ValueError):
+            await self.storage.save("../outside.webp", b"", "image/webp")
+
+    async def test_storage_backends(self):
+        with self.assertRaises(TypeError):
+            Storage()
+        with patch("cloudinary.uploader.upload") as upload_mock:
+            self.assertFalse(await CloudinaryStorage().exists("avatars/1/digest.webp"))
+        upload_mock.assert_not_called()
+
+
+def test_render_avatar():
+    image_module = pytest.importorskip("PIL.Image")
+    source = io.BytesIO()
+    image_module.new("RGB", (640, 480), "red").save(source, format="PNG")
+    source.seek(0)
+    data, content_type = render_avatar(source)
+    assert content_type == "image/webp"
+    with image_module.open(io.BytesIO(data)) as avatar:
+        assert avatar.size == (250, 250)
+        assert avatar.format == "WEBP"
+    with pytest.raises(InvalidAvatar):
+        render_avatar(io.BytesIO(b"not an image"))
+    source.seek(0)
+    with patch.object(image_module, "MAX_IMAGE_PIXELS", 100), pytest.raises(InvalidAvatar):
+        render_avatar(source)
@@ -0,0 +1,71 @@
+import unittest
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.conf.config import Settings
+from src.middleware.ban import BanMiddleware, BanRules
+
+
+class TestBanRules(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rules = BanRules([r"Googlebot", r"Python-urllib/\d"], ["10.0.0.0/8", "192.168.1.7", "2001:db8::/32"])
+
+    def test_user_agents(self):
+        self.assertTrue(self.rules.is_banned_user_agent("Mozilla/5.0 (compatible; Googlebot/2.1)"))
+        self.assertTrue(self.rules.is_banned_user_agent("Python-urllib/3.11"))
+        self.assertFalse(self.rules.is_banned_user_agent("Mozilla/5.0 Gecko"))
+        self.assertFalse(self.rules.is_banned_user_agent(None))
+
+    def test_networks(self):
+        self.assertTrue(self.rules.is_banned_host("10.20.30.40"))
+        self.assertTrue(self.rules.is_banned_host("192.168.1.7"))
+        self.assertFalse(self.rules.is_banned_host("192.168.1.8"))
+        self.assertTrue(self.rules.is_banned_host("2001:db8::1"))
+        self.assertTrue(self.rules.is_banned_host("::ffff:10.0.0.1"))
+        self.assertFalse(self.rules.is_banned_host("127.0.0.1"))
+        self.assertFalse(self.rules.is_banned_host("testclient"))
+        self.assertFalse(self.rules.is_banned_host(None))
+
+    def test_reload_keeps_rules_on_error(self):
+        self.rules.reload(Settings(BANNED_USER_AGENTS=["curl"], BANNED_NETWORKS=["not a network"]))
+        self.assertTrue(self.rules.is_banned_host("10.0.0.1"))
+        self.assertFalse(self.rules.is_banned_user_agent("curl/8.0"))
+        self.rules.reload(Settings(BANNED_USER_AGENTS=["curl"], BANNED_NETWORKS=[]))
+        self.assertFalse(self.rules.is_banned_host("10.0.0.1"))
+        self.assertTrue(self.rules.is_banned_user_agent("curl/8.0"))
+
+
+class TestBanMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rules = BanRules([r"Googlebot"])
+        app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+        self.client = TestClient(BanMiddleware(app, self.rules))
+
+    def test_allowed(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "ok")
+
+    def test_missing_user_agent(self):
+        response = self.client.get("/", headers={"User-Agent": ""})
+        self.assertEqual(response.status_code, 200)
+
+    def test_banned_user_agent(self):
+        response = self.client.get("/", headers={"User-Agent": "Googlebot/2.1"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {"detail": "You are banned"})
+
+    def test_banned_network(self):
+        self.rules.load([], ["203.0.113.0/24"])
+        middleware = self.client.app
+
+        async def from_address(scope, receive, send):
+            await middleware(dict(scope, client=("203.0.113.5", 1234)), receive, send)
+
+        self.assertEqual(TestClient(from_address).get("/").status_code, 403)
+        self.assertEqual(self.client.get("/").status_code, 200)
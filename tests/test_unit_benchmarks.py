@@ -0,0 +1,27 @@
+import unittest
+
+from benchmarks.api import percentile, summarize, compare
+
+
+class TestBenchmarkReport(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.95), 95.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize(self):
+        result = summarize([0.01, 0.02, 0.03, 0.04], errors=1, elapsed=0.5)
+        self.assertEqual(result["requests"], 4)
+        self.assertEqual(result["throughput_rps"], 8.0)
+        self.assertEqual(result["p50_ms"], 20.0)
+
+    def test_compare(self):
+        baseline = {"list_page": {"p95_ms": 10.0, "throughput_rps": 100.0, "errors": 0}}
+        same = {"list_page": {"p95_ms": 11.0, "throughput_rps": 95.0, "errors": 0}}
+        worse = {"list_page": {"p95_ms": 13.0, "throughput_rps": 70.0, "errors": 2},
+                 "new": {"p95_ms": 1.0, "throughput_rps": 1.0, "errors": 0}}
+        self.assertEqual(compare(same, baseline, 0.2), [])
+        self.assertEqual(len(compare(worse, baseline, 0.2)), 3)
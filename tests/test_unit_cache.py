@@ -0,0 +1,122 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from redis.exceptions import RedisError
+from sqlalchemy import inspect
+
+from src.entity.models import User, Role
+from src.services.cache import dump_principal, load_principal, LRUCache, PrincipalCache, PRINCIPAL_VERSION, \
+    VersionedResponseCache
+
+
+class TestPrincipalSerialization(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.user = User(id=1, username='test_user', email='test@example.com', password='hash',
+                         refresh_token='token', avatar=None, role=Role.admin, confirmed=True)
+
+    def test_dump_principal_skips_secrets(self):
+        data = json.loads(dump_principal(self.user))
+        self.assertEqual(data["v"], PRINCIPAL_VERSION)
+        self.assertEqual(data["role"], "admin")
+        self.assertNotIn("password", data)
+        self.assertNotIn("refresh_token", data)
+
+    def test_load_principal(self):
+        user = load_principal(dump_principal(self.user))
+        self.assertEqual(user.id, 1)
+        self.assertEqual(user.email, 'test@example.com')
+        self.assertEqual(user.role, Role.admin)
+        self.assertTrue(inspect(user).detached)
+
+    def test_load_principal_other_version(self):
+        raw = json.dumps({"v": PRINCIPAL_VERSION + 1, "id": 1}).encode()
+        self.assertIsNone(load_principal(raw))
+        self.assertIsNone(load_principal(b"not json"))
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1, ttl=5)
+        with patch("src.services.cache.time.monotonic", return_value=106.0):
+            self.assertIsNone(cache.get("a"))
+
+
+class TestPrincipalCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.user = User(id=1, username='test_user', email='test@example.com', role=Role.user, confirmed=True)
+        self.client = AsyncMock()
+        self.cache = PrincipalCache(self.client, LRUCache(maxsize=10, ttl=60))
+
+    async def test_get_from_local_cache(self):
+        await self.cache.set(self.user)
+        user = await self.cache.get(self.user.email)
+        self.assertEqual(user.id, self.user.id)
+        self.assertIsNot(user, self.user)
+        self.client.get.assert_not_called()
+
+    async def test_get_from_redis(self):
+        self.client.get.return_value = dump_principal(self.user)
+        user = await self.cache.get(self.user.email)
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(len(self.cache.local), 1)
+
+    async def test_redis_unavailable(self):
+        self.client.get.side_effect = RedisError("down")
+        self.client.set.side_effect = RedisError("down")
+        self.assertIsNone(await self.cache.get(self.user.email))
+        await self.cache.set(self.user)
+        self.assertIsNotNone(await self.cache.get(self.user.email))
+
+
+class TestVersionedResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.client = AsyncMock()
+        self.cache = VersionedResponseCache(self.client, "contacts", ttl=60)
+
+    async def test_miss_returns_current_version(self):
+        self.client.get.side_effect = [b"3", None]
+        version, cached = await self.cache.get(1, "limit=10")
+        self.assertEqual(version, 3)
+        self.assertIsNone(cached)
+        self.client.get.assert_awaited_with(self.cache.page_key(1, 3, "limit=10"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    async def test_hit(self):
+        await self.cache.set(1, 0, "limit=10", {"ETag": "W/\"x\""}, b"[]")
+        raw = self.client.set.call_args.args[1]
+        self.client.get.side_effect = [None, raw]
+        version, cached = await self.cache.get(1, "limit=10")
+        self.assertEqual(version, 0)
+        self.assertEqual(cached, ({"ETag": "W/\"x\""}, b"[]"))
+        self.assertEqual(self.cache.stats()["hit_ratio"], 1.0)
+
+    async def test_bump_changes_page_key(self):
+        await self.cache.bump(1)
+        self.client.incr.assert_awaited_once_with("contacts:v:1")
+        self.assertNotEqual(self.cache.page_key(1, 0, "q"), self.cache.page_key(1, 1, "q"))
+
+    async def test_disabled_or_unavailable(self):
+        self.client.get.side_effect = RedisError("down")
+        self.assertEqual(await self.cache.get(1, "q"), (None, None))
+        self.assertEqual(self.cache.errors, 1)
+        self.cache.enabled = False
+        await self.cache.bump(1)
+        self.client.incr.assert_not_called()
@@ -0,0 +1,99 @@
+import asyncio
+import gzip
+import unittest
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.middleware.compression import CompressionMiddleware, parse_accept_encoding
+
+BIG = [{"id": i, "email": f"contact{i}@example.com"} for i in range(100)]
+
+
+async def stream_chunks():
+    for i in range(3):
+        yield f'{{"chunk": {i}}}\n'.encode() * 50
+
+
+def make_app(**options):
+    routes = [
+        Route("/big", lambda request: JSONResponse(BIG, headers={"ETag": '"abc"'})),
+        Route("/small", lambda request: JSONResponse({"ok": True})),
+        Route("/image", lambda request: Response(b"\0" * 2000, media_type="image/png")),
+        Route("/stream", lambda request: StreamingResponse(stream_chunks(), media_type="application/x-ndjson")),
+    ]
+    return CompressionMiddleware(Starlette(routes=routes), **options)
+
+
+class TestAcceptEncoding(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_accept_encoding("gzip;q=0.5, BR, *;q=0, bad;q=x"),
+                         {"gzip": 0.5, "br": 1.0, "*": 0.0, "bad": 0.0})
+
+    def test_select(self):
+        middleware = make_app()
+        self.assertEqual(middleware.select_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(middleware.select_encoding("*"), next(iter(middleware.encoders)))
+        self.assertIsNone(middleware.select_encoding("gzip;q=0, deflate"))
+        self.assertIsNone(middleware.select_encoding(""))
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = TestClient(make_app(minimum_size=500))
+
+    def test_compresses_large_json(self):
+        response = self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.headers["etag"], 'W/"abc"')
+        self.assertEqual(response.json(), BIG)
+
+    def test_skips_small_and_binary_responses(self):
+        response = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.json(), {"ok": True})
+        response = self.client.get("/image", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", response.headers)
+
+    def test_identity(self):
+        response = self.client.get("/big", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.headers["etag"], '"abc"')
+
+
+class TestStreamingCompression(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chunks_are_compressed_incrementally(self):
+        scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "query_string": b"",
+                 "root_path": "", "headers": [(b"accept-encoding", b"gzip")], "http_version": "1.1",
+                 "scheme": "http", "server": ("testserver", 80), "client": ("testclient", 50000)}
+        messages = []
+        requests = [{"type": "http.request", "body": b"", "more_body": False}]
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await make_app()(scope, receive, send)
+        start, *bodies = messages
+        self.assertIn((b"content-encoding", b"gzip"), start["headers"])
+        self.assertNotIn(b"content-length", dict(start["headers"]))
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = [decoder.decompress(message["body"]) for message in bodies]
+        # every chunk can be decoded as soon as it arrives
+        self.assertEqual(chunks[:3], [f'{{"chunk": {i}}}\n'.encode() * 50 for i in range(3)])
+        self.assertFalse(bodies[-1].get("more_body", False))
+        self.assertEqual(gzip.decompress(b"".join(message["body"] for message in bodies)),
+                         b"".join(chunks))
@@ -0,0 +1,31 @@
+import unittest
+from unittest.mock import patch
+
+from src.services.email import EmailTemplates, conf, template_render_duration
+
+
+class TestEmailTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.templates = EmailTemplates(conf.TEMPLATE_FOLDER)
+
+    def test_compile(self):
+        self.assertIn("verify_email.html", self.templates.compile())
+
+    def test_render_does_not_reload(self):
+        self.templates.compile()
+        context = {"host": "http://test/", "username": "agent", "token": "abc"}
+        before = template_render_duration.count(template="verify_email.html")
+        with patch.object(self.templates.env.loader, "get_source", side_effect=AssertionError("reloaded")):
+            for n in range(3):
+                html = self.templates.render("verify_email.html", dict(context, username=f"user{n}"))
+                self.assertIn(f"Hi user{n},", html)
+        self.assertIn("http://test/api/auth/confirmed_email/abc", html)
+        self.assertEqual(template_render_duration.count(template="verify_email.html"), before + 3)
+
+    def test_render_loads_missing_template_once(self):
+        with patch.object(self.templates.env.loader, "get_source",
+                          wraps=self.templates.env.loader.get_source) as get_source:
+            self.templates.render("verify_email.html", {})
+            self.templates.render("verify_email.html", {})
+        self.assertEqual(get_source.call_count, 1)
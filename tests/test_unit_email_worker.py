@@ -0,0 +1,163 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import aiosmtplib
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.entity.models import Base, EmailOutbox, OutboxStatus
+from src.repository import outbox as repositories_outbox
+from src.services.email import send_email, SMTPMailer
+from src.services.email_worker import EmailWorker, retry_delay
+
+
+class FakeMailer:
+
+    def __init__(self, errors=None):
+        self.messages = []
+        self.errors = errors or {}
+        self.closed = 0
+
+    async def send(self, message):
+        error = self.errors.get(message["To"])
+        if error is not None:
+            raise error
+        self.messages.append(message)
+
+    async def close(self):
+        self.closed += 1
+
+
+class TestEmailWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory.name, 'outbox.db')}")
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def entries(self):
+        async with self.session_maker() as db:
+            return (await db.execute(select(EmailOutbox).order_by(EmailOutbox.id))).scalars().all()
+
+    def test_retry_delay(self):
+        self.assertEqual(retry_delay(1, 30), 30)
+        self.assertEqual(retry_delay(3, 30), 120)
+        self.assertEqual(retry_delay(20, 30), 3600)
+
+    async def test_sends_in_batches(self):
+        async with self.session_maker() as db:
+            for n in range(5):
+                await send_email(f"user{n}@example.com", f"user{n}", "http://test/", db)
+        mailer = FakeMailer()
+        worker = EmailWorker(self.session_maker, mailer, batch_size=2)
+        self.assertEqual([await worker.run_once() for _ in range(4)], [2, 2, 1, 0])
+        self.assertEqual([message["To"] for message in mailer.messages],
+                         [f"user{n}@example.com" for n in range(5)])
+        self.assertIn("http://test/api/auth/confirmed_email/", mailer.messages[0].get_content())
+        self.assertTrue(all(entry.status == OutboxStatus.sent for entry in await self.entries()))
+        async with self.session_maker() as db:
+            self.assertEqual(await repositories_outbox.outbox_stats(db), {"pending": 0, "failed": 0,
+                                                                          "lag_seconds": 0.0})
+
+    async def test_retries_with_backoff_then_gives_up(self):
+        async with self.session_maker() as db:
+            await send_email("flaky@example.com", "flaky", "http://test/", db)
+            await send_email("refused@example.com", "refused", "http://test/", db)
+        mailer = FakeMailer({
+            "flaky@example.com": aiosmtplib.SMTPServerDisconnected("gone"),
+            "refused@example.com": aiosmtplib.SMTPRecipientsRefused([]),
+        })
+        worker = EmailWorker(self.session_maker, mailer, max_attempts=2, retry_seconds=60)
+        self.assertEqual(await worker.run_once(), 2)
+        flaky, refused = await self.entries()
+        self.assertEqual((flaky.status, flaky.attempts), (OutboxStatus.pending, 1))
+        self.assertGreater(flaky.next_attempt_at, datetime.utcnow() + timedelta(seconds=50))
+        self.assertEqual((refused.status, refused.attempts), (OutboxStatus.failed, 1))
+        self.assertEqual(await worker.run_once(), 0)
+
+        async with self.session_maker() as db:
+            await repositories_outbox.mark_failed(flaky.id, "rescheduled", datetime.utcnow(), db)
+        self.assertEqual(await worker.run_once(), 1)
+        flaky, _ = await self.entries()
+        self.assertEqual((flaky.status, flaky.attempts), (OutboxStatus.failed, 3))
+        self.assertEqual(worker.failed, 2)
+
+    async def test_claimed_emails_are_leased(self):
+        async with self.session_maker() as db:
+            await send_email("user@example.com", "user", "http://test/", db)
+            self.assertEqual(len(await repositories_outbox.claim_batch(10, 300, db)), 1)
+            self.assertEqual(len(await repositories_outbox.claim_batch(10, 300, db)), 0)
+            self.assertEqual((await repositories_outbox.outbox_stats(db))["pending"], 1)
+
+    async def test_purges_old_sent_emails(self):
+        async with self.session_maker() as db:
+            for n in range(3):
+                await send_email(f"user{n}@example.com", f"user{n}", "http://test/", db)
+        worker = EmailWorker(self.session_maker, FakeMailer(), retention_days=1)
+        await worker.run_once()
+        old, recent, _ = await self.entries()
+        async with self.session_maker() as db:
+            await db.execute(update(EmailOutbox).where(EmailOutbox.id == old.id)
+                             .values(sent_at=datetime.utcnow() - timedelta(days=2)))
+            await repositories_outbox.mark_failed(recent.id, "refused", None, db)
+        self.assertEqual(await worker.purge(), 1)
+        self.assertEqual([entry.id for entry in await self.entries()], [recent.id, recent.id + 1])
+        async with self.session_maker() as db:
+            self.assertEqual((await repositories_outbox.outbox_stats(db))["failed"], 1)
+
+    async def test_run_stops(self):
+        stop = asyncio.Event()
+        mailer = FakeMailer()
+        task = asyncio.create_task(EmailWorker(self.session_maker, mailer).run(0.01, stop))
+        await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.wait_for(task, 1)
+        self.assertGreater(mailer.closed, 0)
+
+
+def test_smtp_mailer_reuses_connection(tmp_path):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    received = []
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope.rcpt_tos)
+            return "250 OK"
+
+    controller = controller_module.Controller(Handler(), hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        async def run():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+            async with session_maker() as db:
+                for n in range(3):
+                    await send_email(f"user{n}@example.com", f"user{n}", "http://test/", db)
+            mailer = SMTPMailer("127.0.0.1", port, start_tls=False)
+            worker = EmailWorker(session_maker, mailer)
+            await worker.run_once()
+            await mailer.close()
+            await engine.dispose()
+            return mailer.connections, worker.sent
+
+        connections, sent = asyncio.run(run())
+    finally:
+        controller.stop()
+    assert (connections, sent) == (1, 3)
+    assert received == [[f"user{n}@example.com"] for n in range(3)]
@@ -0,0 +1,77 @@
+import unittest
+
+from sqlalchemy import create_engine, text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.database.instrumentation import (current_queries, instrument_engine, parameter_shape, query_budget,
+                                          track_queries)
+from src.middleware.queries import QueryTrackingMiddleware
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://")
+
+    def test_parameter_shape(self):
+        self.assertEqual(parameter_shape((1, "secret@example.com")), "(int, str)")
+        self.assertEqual(parameter_shape({"email": "secret@example.com"}), "{email: str}")
+        self.assertEqual(parameter_shape([(1, "a"), (2, "b")], executemany=True), "2 x (int, str)")
+
+    def test_counts_queries_per_context(self):
+        instrument_engine(self.engine, slow_query_seconds=0, repeat_threshold=3)
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            with track_queries() as stats:
+                with self.assertLogs("src.database.instrumentation", level="WARNING") as logs:
+                    for value in range(4):
+                        connection.execute(text("SELECT :value"), {"value": value})
+            connection.execute(text("SELECT 2"))
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.shapes.most_common(1)[0][1], 4)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("possible N+1", logs.output[0])
+
+    def test_slow_query_log_hides_values(self):
+        instrument_engine(self.engine, slow_query_seconds=1e-9, repeat_threshold=0)
+        with self.assertLogs("src.database.instrumentation", level="WARNING") as logs:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT :email"), {"email": "secret@example.com"})
+        self.assertIn("slow query", logs.output[0])
+        self.assertIn("(str)", logs.output[0])
+        self.assertNotIn("secret@example.com", logs.output[0])
+
+    def test_query_budget(self):
+        with self.engine.connect() as connection:
+            with query_budget(self.engine, 1) as stats:
+                connection.execute(text("SELECT 1"))
+            self.assertEqual(stats.count, 1)
+            with self.assertRaisesRegex(AssertionError, "2 queries executed, budget is 1"):
+                with query_budget(self.engine, 1):
+                    connection.execute(text("SELECT 1"))
+                    connection.execute(text("SELECT 2"))
+
+    def test_middleware_tracks_requests_without_metrics(self):
+        instrument_engine(self.engine, slow_query_seconds=0, repeat_threshold=3)
+        seen = []
+
+        def items(request):
+            with self.engine.connect() as connection:
+                for value in range(3):
+                    connection.execute(text("SELECT :value"), {"value": value})
+            seen.append(current_queries.get())
+            return PlainTextResponse("ok")
+
+        app = Starlette(routes=[Route("/items", items)])
+        app.add_middleware(QueryTrackingMiddleware)
+        with self.assertLogs("src.database.instrumentation", level="WARNING") as logs:
+            response = TestClient(app).get("/items")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(seen[0].count, 3)
+        self.assertIn("possible N+1", logs.output[0])
+        with track_queries() as outer:
+            TestClient(app).get("/items")
+        self.assertIs(seen[1], outer)
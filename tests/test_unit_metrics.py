@@ -0,0 +1,83 @@
+import unittest
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.middleware.metrics import MetricsMiddleware, UNMATCHED_ROUTE
+from src.services.metrics import Registry, timing, record_timing
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.counter("requests_total", "Requests", ("route",))
+        counter.inc(route="/a")
+        counter.inc(2, route='/b"')
+        gauge = self.registry.gauge("in_flight", "In flight")
+        gauge.inc()
+        gauge.dec()
+        text = self.registry.render()
+        self.assertIn("# TYPE requests_total counter\n", text)
+        self.assertIn('requests_total{route="/a"} 1\n', text)
+        self.assertIn('requests_total{route="/b\\""} 2\n', text)
+        self.assertIn("in_flight 0\n", text)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("latency_seconds_sum 5.55\n", text)
+        self.assertIn("latency_seconds_count 3\n", text)
+
+    def test_stats_collector(self):
+        self.registry.stats("pool", "Pool", lambda: {"size": 5, "missing": None})
+        self.assertIn("# TYPE pool_size gauge\npool_size 5\n", self.registry.render())
+        self.assertNotIn("pool_missing", self.registry.render())
+
+    def test_duplicate_name(self):
+        self.registry.counter("x", "X")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("x", "X")
+
+
+async def item(request):
+    with timing("db"):
+        pass
+    record_timing("auth", 0.002)
+    return PlainTextResponse("ok")
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.registry = Registry()
+        app = Starlette(routes=[Route("/items/{item_id}", item)])
+        app.add_middleware(MetricsMiddleware, registry=self.registry, server_timing=True)
+        self.client = TestClient(app)
+
+    def test_records_route_template(self):
+        response = self.client.get("/items/1")
+        self.client.get("/items/2")
+        self.client.get("/missing")
+        self.assertEqual(response.status_code, 200)
+        text = self.registry.render()
+        self.assertIn('http_requests_total{method="GET",route="/items/{item_id}",status="2xx"} 2\n', text)
+        self.assertIn(f'http_requests_total{{method="GET",route="{UNMATCHED_ROUTE}",status="4xx"}} 1\n', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/items/{item_id}"} 2\n', text)
+        self.assertIn('http_requests_in_progress{method="GET",route="/items/{item_id}"} 0\n', text)
+
+    def test_server_timing(self):
+        response = self.client.get("/items/1")
+        phases = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+        self.assertEqual(phases, ["db", "auth", "total"])
+        self.assertIn("auth;dur=2.00", response.headers["server-timing"])
@@ -0,0 +1,180 @@
+import socket
+import time
+import unittest
+import uuid
+from ipaddress import ip_network
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis.asyncio as redis
+from fastapi import HTTPException, Response
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+from starlette.requests import Request
+
+from src.conf.config import config
+from src.services.rate_limit import SlidingWindow, TokenBucket, RateLimitService, RateLimiter, decisions_total, \
+    client_identity, user_identity
+
+
+def make_service(script_result=None, side_effect=None) -> tuple[RateLimitService, AsyncMock]:
+    script = AsyncMock(return_value=script_result, side_effect=side_effect)
+    client = MagicMock()
+    client.register_script.return_value = script
+    return RateLimitService(client), script
+
+
+def make_request(headers: dict | None = None, host: str = "10.0.0.1") -> Request:
+    raw = [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/users/me", "headers": raw,
+                    "client": (host, 1234), "query_string": b""})
+
+
+class TestSlidingWindow(unittest.TestCase):
+
+    def test_limits_and_slides(self):
+        window = SlidingWindow()
+        results = [window.hit("k", limit=3, window=10, now=100.0).allowed for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        # halfway through the next window half of the previous window still counts
+        self.assertTrue(window.hit("k", limit=3, window=10, now=115.0).allowed)
+        self.assertFalse(window.hit("k", limit=3, window=10, now=115.0).allowed)
+        self.assertTrue(window.hit("k", limit=3, window=10, now=130.0).allowed)
+
+    def test_retry_after(self):
+        window = SlidingWindow()
+        window.hit("k", limit=1, window=10, now=102.0)
+        decision = window.hit("k", limit=1, window=10, now=104.0)
+        self.assertFalse(decision.allowed)
+        self.assertAlmostEqual(decision.retry_after, 16.0)
+        self.assertFalse(window.hit("k", limit=1, window=10, now=119.9).allowed)
+        self.assertTrue(window.hit("k", limit=1, window=10, now=120.0).allowed)
+
+        window = SlidingWindow()
+        for _ in range(4):
+            window.hit("k", limit=4, window=10, now=100.0)
+        decision = window.hit("k", limit=4, window=10, now=112.0)
+        self.assertFalse(decision.allowed)
+        self.assertAlmostEqual(decision.retry_after, 0.5)
+        self.assertTrue(window.hit("k", limit=4, window=10, now=112.5).allowed)
+        decision = window.hit("k", limit=4, window=10, now=112.5)
+        self.assertAlmostEqual(decision.retry_after, 2.5)
+        self.assertTrue(window.hit("k", limit=4, window=10, now=115.0).allowed)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_refills(self):
+        bucket = TokenBucket(2, now=0.0)
+        self.assertEqual([bucket.take(2, 10, 0.0) for _ in range(3)], [True, True, False])
+        self.assertTrue(bucket.take(2, 10, 5.0))
+        self.assertEqual(bucket.unsynced, 3)
+
+
+class TestRateLimitService(unittest.IsolatedAsyncioTestCase):
+
+    async def test_redis_decision(self):
+        service, script = make_service([0, 5, 1500])
+        decision = await service.hit("policy", "user:a", limit=5, window=10)
+        self.assertEqual((decision.allowed, decision.remaining, decision.retry_after, decision.backend),
+                         (False, 0, 1.5, "redis"))
+        script.assert_awaited_once_with(keys=["ratelimit:{policy:user:a}"], args=[10000, 5, 1, 0])
+        self.assertEqual(decisions_total.value(policy="policy", decision="denied", backend="redis"), 1)
+
+    async def test_falls_back_to_memory(self):
+        service, script = make_service(side_effect=RedisConnectionError("down"))
+        with self.assertLogs("src.services.rate_limit", "WARNING"):
+            results = [(await service.hit("fallback", "ip:1", limit=2, window=60)).allowed for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        # Redis is not retried on every request while it is down
+        self.assertEqual(script.await_count, 1)
+        self.assertEqual(decisions_total.value(policy="fallback", decision="allowed", backend="memory"), 2)
+
+    async def test_stalled_redis_times_out(self):
+        # accepts connections (through the backlog) but never answers
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        self.addCleanup(server.close)
+        client = redis.Redis(host="127.0.0.1", port=server.getsockname()[1], socket_connect_timeout=0.2,
+                             socket_timeout=0.2)
+        self.addAsyncCleanup(client.close)
+        service = RateLimitService(client)
+        started = time.monotonic()
+        with self.assertLogs("src.services.rate_limit", "WARNING"):
+            decision = await service.hit("stalled", "ip:1", limit=2, window=60)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual((decision.allowed, decision.backend), (True, "memory"))
+
+    async def test_local_bucket_syncs_in_batches(self):
+        service, script = make_service([1, 8, 0])
+        results = [(await service.hit("local", "user:a", limit=10, window=60, local=True, sync_batch=4)).allowed
+                   for _ in range(4)]
+        self.assertEqual(results, [True] * 4)
+        script.assert_awaited_once_with(keys=["ratelimit:{local:user:a}"], args=[60000, 10, 4, 1])
+        # the shared window has 8 of 10 used: the bucket keeps no more than the 2 left
+        results = [(await service.hit("local", "user:a", limit=10, window=60, local=True, sync_batch=4)).allowed
+                   for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+
+class TestSlidingWindowScript(unittest.IsolatedAsyncioTestCase):
+    """
+    SLIDING_WINDOW_SCRIPT against the Redis of the config; skipped when no Redis server is reachable.
+    """
+
+    async def asyncSetUp(self):
+        self.client = redis.Redis(host=config.REDIS_DOMAIN, port=config.REDIS_PORT, password=config.REDIS_PASSWORD,
+                                  socket_connect_timeout=0.5, socket_timeout=0.5)
+        self.addAsyncCleanup(self.client.close)
+        try:
+            await self.client.ping()
+        except RedisError as err:
+            self.skipTest(f"Redis is not available: {err}")
+        self.service = RateLimitService(self.client, prefix=f"ratelimit-test-{uuid.uuid4().hex}")
+        self.addAsyncCleanup(self.delete_keys)
+
+    async def delete_keys(self):
+        keys = [key async for key in self.client.scan_iter(f"{self.service.prefix}:*")]
+        if keys:
+            await self.client.delete(*keys)
+
+    async def test_limits_and_retry_after(self):
+        decisions = [await self.service.hit("script", "user:a", limit=3, window=60) for _ in range(4)]
+        self.assertEqual([(decision.allowed, decision.remaining, decision.backend) for decision in decisions],
+                         [(True, 2, "redis"), (True, 1, "redis"), (True, 0, "redis"), (False, 0, "redis")])
+        self.assertTrue(0 < decisions[-1].retry_after <= 120)
+        self.assertTrue((await self.service.hit("script", "user:b", limit=3, window=60)).allowed)
+
+    async def test_forced_cost_is_recorded(self):
+        key = self.service._key("script", "user:a")
+        synced = await self.service._redis(key, 3, 60, 5, force=True)
+        self.assertEqual((synced.allowed, synced.remaining), (True, 0))
+        self.assertFalse((await self.service.hit("script", "user:a", limit=3, window=60)).allowed)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def test_identity(self):
+        self.assertEqual(client_identity(make_request()), "ip:10.0.0.1")
+        self.assertEqual(client_identity(make_request({"X-Forwarded-For": "1.2.3.4"})), "ip:10.0.0.1")
+        with patch("src.services.rate_limit.trusted_proxies", [ip_network("10.0.0.0/8")]):
+            self.assertEqual(client_identity(make_request({"X-Forwarded-For": "1.2.3.4"})), "ip:1.2.3.4")
+            self.assertEqual(client_identity(make_request({"X-Forwarded-For": "6.6.6.6, 1.2.3.4, 10.0.0.2"})),
+                             "ip:1.2.3.4")
+            self.assertEqual(client_identity(make_request({"X-Forwarded-For": "1.2.3.4"}, host="5.5.5.5")),
+                             "ip:5.5.5.5")
+        self.assertEqual(user_identity(make_request({"Authorization": "Bearer invalid"})), "ip:10.0.0.1")
+        with patch("src.services.rate_limit.auth_service.decode_access_token", return_value={"sub": "a@b.c"}):
+            self.assertEqual(user_identity(make_request({"Authorization": "Bearer token"})), "user:a@b.c")
+
+    async def test_dependency(self):
+        service, _ = make_service(side_effect=RedisConnectionError("down"))
+        limiter = RateLimiter(times=1, seconds=20, name="test", per="ip", service=service)
+        response = Response()
+        with self.assertLogs("src.services.rate_limit", "WARNING"):
+            await limiter(make_request(), response)
+        self.assertEqual(response.headers["X-RateLimit-Remaining"], "0")
+        with self.assertRaises(HTTPException) as context:
+            await limiter(make_request(), Response())
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertTrue(20 <= int(context.exception.headers["Retry-After"]) <= 40)
+        await limiter(make_request(host="10.0.0.2"), Response())
@@ -1,10 +1,11 @@
 import unittest
 from unittest.mock import MagicMock, AsyncMock, Mock
 
+from sqlalchemy import Update, Delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.entity.models import Contact, User
-from src.schemas.contact import ContactSchema, ContactUpdateSchema
+from src.schemas.contact import ContactSchema, ContactUpdateSchema, ContactPatchSchema
 from src.repository.contacts import create_contact, get_all_contacts, get_contact, update_contact, delete_contact, \
     get_contacts
 
@@ -49,7 +50,7 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         ]
         # Створюємо фіктивний результат запиту до бази даних
         mocked_result = MagicMock()
-        mocked_result.scalars.return_value.all.return_value = contacts
+        mocked_result.all.return_value = contacts
         # Моделюємо поведінку сесії бази даних
         self.session.execute.return_value = mocked_result
         # Викликаємо тестовану функцію
@@ -99,7 +100,7 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
             )
         ]
         mocked_contacts = Mock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
+        mocked_contacts.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
         result = await get_contacts(limit, offset, self.session, self.user)
         self.assertEqual(result, contacts)
@@ -134,26 +135,17 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
     async def test_update_contact(self):
         # Підготовка вхідних даних
         contact_id = 1
-        body = ContactUpdateSchema(
-            first_name='test_first_name_2',
-            last_name='test_last_name_2',
-            email='test_email_2@example.com',
-            phone_number='0987654321',
-            birthday='2001-01-01',
-            extra_info='Some other info',
-            completed=False
-        )
-        # Підготовка макету результату запиту до бази даних
+        body = ContactPatchSchema(last_name='test_last_name_2', first_name=None, birthday=None)
+        # Контакт, який повертає UPDATE ... RETURNING
         mocked_contact = Contact(
             id=contact_id,
             first_name='old_first_name',
-            last_name='old_last_name',
+            last_name='test_last_name_2',
             email='old_email@example.com',
             phone_number='9876543210',
-            birthday='1990-01-01',
+            birthday=None,
             extra_info='Old extra info'
         )
-        # Макет результату запиту до бази даних
         mocked_result = MagicMock()
         mocked_result.scalar_one_or_none.return_value = mocked_contact
         self.session.execute.return_value = mocked_result
@@ -161,38 +153,44 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         # Виклик функції update_contact
         result = await update_contact(contact_id, body, self.session, self.user)
 
-        # Перевірка, чи оновлено контакт з вірними даними
-        self.assertEqual(result.id, contact_id)
-        self.assertEqual(result.first_name, body.first_name)
-        self.assertEqual(result.last_name, body.last_name)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone_number, body.phone_number)
-        self.assertEqual(result.birthday, body.birthday)
-        self.assertEqual(result.extra_info, body.extra_info)
-        self.assertFalse(result.completed)
-        # Перевірка, чи викликався метод коміту бази даних
+        # Один запит UPDATE ... RETURNING лише з переданими полями
+        self.session.execute.assert_called_once()
+        stmt = self.session.execute.call_args[0][0]
+        self.assertIsInstance(stmt, Update)
+        self.assertEqual({column.key for column in stmt._values}, {'last_name', 'birthday'})
+        self.assertEqual(result, mocked_contact)
+        self.assertEqual(result.user, self.user)
         self.session.commit.assert_called_once()
-        # Перевірка, чи викликався метод оновлення контакту в базі даних
-        self.session.refresh.assert_called_once_with(mocked_contact)
+        self.session.refresh.assert_not_called()
 
+    async def test_update_contact_not_found(self):
+        mocked_result = MagicMock()
+        mocked_result.scalar_one_or_none.return_value = None
+        self.session.execute.return_value = mocked_result
+        body = ContactUpdateSchema(first_name='test_first_name', completed=True)
+        result = await update_contact(1, body, self.session, self.user)
+        self.assertIsNone(result)
 
     async def test_delete_contact(self):
         # Підготовка тестового контакту
         contact_id = 1
         contact = Contact(id=contact_id, first_name='Test', last_name='Contact', user=self.user)
 
-        # Макет результату запиту до бази даних
+        # Макет результату DELETE ... RETURNING
         mocked_result = MagicMock()
         mocked_result.scalar_one_or_none.return_value = contact
         self.session.execute.return_value = mocked_result
 
         # Виклик функції delete_contact
-        await delete_contact(contact_id, self.session, self.user)
+        result = await delete_contact(contact_id, self.session, self.user)
 
-        # Перевірка, чи викликався метод видалення контакту з бази даних
-        self.session.delete.assert_called_once_with(contact)
+        # Перевірка, що контакт видалено одним запитом DELETE
+        self.session.execute.assert_called_once()
+        self.assertIsInstance(self.session.execute.call_args[0][0], Delete)
+        self.session.delete.assert_not_called()
         # Перевірка, чи викликався метод коміту бази даних
         self.session.commit.assert_called_once()
+        self.assertEqual(result, contact)
 
 
 
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import random
+import tempfile
+import unittest
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.seed import zipf_counts, generate_contacts, seed_database
+from src.entity.models import Contact, User
+
+
+class TestSeed(unittest.TestCase):
+
+    def test_zipf_counts(self):
+        counts = zipf_counts(10000, 100, 1.1, random.Random(1))
+        self.assertEqual(sum(counts), 10000)
+        self.assertEqual(len(counts), 100)
+        self.assertGreater(max(counts), 10 * min(counts))
+        self.assertEqual(counts, zipf_counts(10000, 100, 1.1, random.Random(1)))
+        self.assertEqual(zipf_counts(5, 0, 1.1, random.Random(1)), [])
+
+    def test_generate_contacts_is_deterministic(self):
+        first = list(generate_contacts(random.Random(7), 1, 50))
+        second = list(generate_contacts(random.Random(7), 1, 50))
+        self.assertEqual(first, second)
+        self.assertTrue(all(len(record[2]) <= 40 for record in first))
+
+    def test_seed_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory.name, 'seed.db')}")
+
+        async def run():
+            try:
+                report = await seed_database(engine, users=20, contacts=1000, seed=3, batch_size=128)
+                with self.assertRaisesRegex(ValueError, "already has 20 users of seed 3"):
+                    await seed_database(engine, users=20, contacts=1000, seed=3, batch_size=128)
+                async with engine.connect() as connection:
+                    users = await connection.scalar(select(func.count(User.id)))
+                    contacts = await connection.scalar(select(func.count(Contact.id)))
+                    largest = await connection.scalar(
+                        select(func.count(Contact.id)).group_by(Contact.user_id)
+                        .order_by(func.count(Contact.id).desc()).limit(1))
+                return report, users, contacts, largest
+            finally:
+                await engine.dispose()
+
+        report, users, contacts, largest = asyncio.run(run())
+        self.assertEqual(report["users"], 20)
+        self.assertEqual(report["contacts"], 1000)
+        self.assertEqual((users, contacts), (20, 1000))
+        self.assertGreater(largest, 1000 // 20)
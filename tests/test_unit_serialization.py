@@ -0,0 +1,47 @@
+import json
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select, literal, Date
+
+from src.entity.models import Contact, User, Role
+from src.schemas.contact import ContactResponse, ContactFieldsResponse
+from src.services import serialization
+from src.services.serialization import encode_contacts, json_dumps
+
+
+class TestEncodeContacts(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.user = User(id=1, username="test_user", email="test@example.com", avatar=None, role=Role.user)
+        self.contact = Contact(id=2, first_name="first", last_name="last", email="c@example.com",
+                               phone_number="123", birthday=date(2000, 1, 31), extra_info="info", completed=False,
+                               created_at=datetime(2024, 1, 1, 10, 0, 0, 123456), updated_at=None)
+
+    def test_orm_contacts_match_response_model(self):
+        self.contact.user = self.user
+        expected = TypeAdapter(list[ContactResponse]).dump_python([self.contact], mode="json")
+        self.assertEqual(json.loads(encode_contacts([self.contact])), expected)
+
+    def test_rows_keep_selected_fields(self):
+        engine = create_engine("sqlite://")
+        with engine.connect() as connection:
+            row = connection.execute(select(literal(2).label("id"), literal("c@example.com").label("email"),
+                                            literal(date(2000, 1, 31), Date).label("birthday"))).one()
+        adapter = TypeAdapter(list[ContactFieldsResponse])
+        expected = adapter.dump_python(adapter.validate_python([row], from_attributes=True), mode="json",
+                                       exclude_unset=True)
+        self.assertEqual(json.loads(encode_contacts([row])), expected)
+        self.assertEqual(set(expected[0]), {"id", "email", "birthday"})
+
+    def test_empty(self):
+        self.assertEqual(encode_contacts([]), b"[]")
+
+    def test_stdlib_fallback(self):
+        data = {"day": date(2000, 1, 31), "role": Role.admin, "name": "Ä"}
+        with patch.object(serialization, "orjson", None):
+            fallback = json_dumps(data)
+        self.assertEqual(json.loads(fallback), json.loads(json_dumps(data)))
+        self.assertEqual(json.loads(fallback), {"day": "2000-01-31", "role": "admin", "name": "Ä"})